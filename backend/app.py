@@ -1,10 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from pathlib import Path
-from typing import List, Literal, Union, Optional
-from pydantic import BaseModel
 from contextlib import asynccontextmanager
-import json
-import os
+from datetime import date
+from typing import List, Optional
 
 from auth_service import (
     app as auth_service_app,
@@ -14,58 +12,36 @@ from auth_service import (
     current_user,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from data_cleaner import clean_and_aggregate
-from project_pipeline.excel_export import generate_excel_report
+from data_cleaner import clean_and_aggregate, DEFAULT_CHUNKSIZE
+from project_pipeline.batch_reports import generate_profiles
+from project_pipeline.email_outbox import email_outbox
+from project_pipeline.email_service import smtp_pool
 from project_pipeline.ppt_export import export_to_ppt
-from project_pipeline.scheduler_service import schedule_email_job
+from project_pipeline.report_jobs import report_jobs
+from project_pipeline.scheduler_service import schedule_email_job, start_scheduler, stop_scheduler
+from project_pipeline.settings_model import ChartSetting, Settings, ALL_KPIS
+from project_pipeline import data_store, site_store
 
 # Base paths
 BASE_DIR = Path(__file__).resolve().parent.parent
-SETTINGS_PATH = Path(__file__).parent / "settings.json"
-
-# --- Models ---
-
-# Chart config (either list of KPIs or equation)
-class ChartSetting(BaseModel):
-    type: Literal["list", "equation"]
-    value: Union[List[str], str]
-
-# All available KPIs
-ALL_KPIS = [f"kpi{i:03d}" for i in range(1, 10)]
-
-# App settings stored in settings.json
-class Settings(BaseModel):
-    days_back: int = 7
-    frequency: Literal["daily", "weekly", "monthly"] = "daily"
-    time: Optional[str] = ""
-    days: List[Union[str, int]] = []
-    mailing_list: str = ""
-    line_chart: ChartSetting = ChartSetting(type="list", value=ALL_KPIS)
-    bar_chart: ChartSetting = ChartSetting(type="list", value=ALL_KPIS)
 
 # --- Settings helpers ---
 
 def read_settings() -> Settings:
     """ Read settings.json (create with defaults if missing) """
-    if not SETTINGS_PATH.exists():
-        s = Settings()
-        SETTINGS_PATH.write_text(s.model_dump_json(indent=2))
-        return s
+    s = data_store.get_settings()
 
-    data = json.loads(SETTINGS_PATH.read_text(encoding="utf-8"))
-    s = Settings(**data)
-
-    # Ensure default KPIs if missing
+    # An empty chart (of any type) defaults to a list of all KPIs
     if not s.line_chart.value:
-        s.line_chart.value = ALL_KPIS
+        s.line_chart = ChartSetting(type="list", value=ALL_KPIS)
     if not s.bar_chart.value:
-        s.bar_chart.value = ALL_KPIS
+        s.bar_chart = ChartSetting(type="list", value=ALL_KPIS)
 
     return s
 
 def write_settings(s: Settings) -> None:
     """Write settings.json."""
-    SETTINGS_PATH.write_text(s.model_dump_json(indent=2))
+    data_store.write_settings(s)
 
 # --- FastAPI lifespan ---
 
@@ -74,12 +50,17 @@ async def lifespan(app: FastAPI):
     """Run startup tasks: clean data, generate reports, start auth."""
     input_file = BASE_DIR / "dataset.csv"
     output_file = BASE_DIR / "backend" / "cleaned_dataset.csv"
-    clean_and_aggregate(input_file, output_file)
+    clean_and_aggregate(input_file, output_file, chunksize=DEFAULT_CHUNKSIZE, incremental=True)
     print(f"Cleaned dataset saved to {output_file}")
-    generate_excel_report()
-    export_to_ppt()
+    report_jobs.submit()
+    await email_outbox.start()
+    start_scheduler()
     await auth_startup()
     yield
+    stop_scheduler()
+    await email_outbox.stop()
+    report_jobs.stop()
+    smtp_pool.close()
     await auth_shutdown()
 
 # --- FastAPI app setup ---
@@ -96,6 +77,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Report-Job-Id"],
 )
 
 # --- Routes ---
@@ -106,14 +88,83 @@ def get_settings():
     return read_settings()
 
 @app.put("/settings", response_model=Settings)
-def put_settings(s: Settings):
-    """Update settings + regenerate reports + reschedule email job."""
+def put_settings(s: Settings, response: Response):
+    """Update settings + reschedule email job; reports are regenerated in the background."""
     write_settings(s)
-    generate_excel_report()
-    export_to_ppt()
+    job = report_jobs.submit(s)
+    schedule_email_job()
+    response.headers["X-Report-Job-Id"] = str(job["id"])
+    return s
+
+@app.get("/reports/status")
+def reports_status():
+    """Latest report job and the current version of each artifact."""
+    return report_jobs.status()
+
+@app.get("/reports/jobs/{job_id}")
+def report_job(job_id: int):
+    """Status of one report regeneration job."""
+    job = report_jobs.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/profiles")
+def get_profiles():
+    """All named report profiles."""
+    return data_store.get_profiles()
+
+@app.put("/profiles/{name}", response_model=Settings)
+def put_profile(name: str, s: Settings):
+    """Create or replace a report profile."""
+    try:
+        data_store.write_profile(name, s)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     schedule_email_job()
     return s
 
+@app.delete("/profiles/{name}")
+def delete_profile(name: str):
+    """Remove a report profile."""
+    if not data_store.delete_profile(name):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    schedule_email_job()
+    return {"message": f"Profile {name} deleted"}
+
+@app.post("/profiles/generate")
+def generate_profile_reports(names: List[str] = Query(default=[]), send: bool = False):
+    """Build the reports of the given profiles (all if none given) in parallel."""
+    try:
+        return generate_profiles(names or None, send=send)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/sites")
+def get_sites():
+    """All site codes in the per-site KPI store."""
+    try:
+        return {"sites": site_store.list_sites()}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/sites/kpis")
+def get_site_kpis(
+    sites: List[str] = Query(default=[]),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    agg: str = "sum",
+):
+    """KPIs per date aggregated over the selected sites (all sites if none given)."""
+    try:
+        df = site_store.query_sites(sites or None, start, end, agg=agg)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+    return {"rows": df.astype(object).where(df.notna(), None).to_dict(orient="records")}
+
 # Mount authentication service under /auth
 app.mount("/auth", auth_service_app)
 
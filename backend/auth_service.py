@@ -4,22 +4,44 @@ from pydantic import BaseModel, EmailStr, Field
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-import asyncpg, os, ssl
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, os, time
 from dotenv import load_dotenv
-from project_pipeline.email_service import send_email_report
+from user_repository import DuplicateEmailError, UserRepository, create_repository
+from project_pipeline.email_outbox import email_outbox
 
 # Load environment variables
 load_dotenv()
 
 # Config
-DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_URL = os.getenv("DATABASE_URL")   # Postgres DSN, "sqlite:///users.db" or "memory://"
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")  # JWT secret
 ALGORITHM = "HS256"
 TOKEN_MIN = int(os.getenv("TOKEN_MINUTES", "1440"))  # Token expiry in minutes
 CORS_ORIGIN = os.getenv("CORS_ORIGIN", "http://localhost:5173")
 
-# Password hashing
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# current_user caches users for USER_CACHE_TTL seconds (up to USER_CACHE_SIZE entries)
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+# Take email/created_at from the signed token and skip the user lookup entirely.
+# Such tokens stay valid for deleted/changed users until they expire (TOKEN_MINUTES).
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "false").lower() in ("1", "true", "yes")
+
+# Password hashing: hashes with a different cost than BCRYPT_ROUNDS are rehashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_ctx = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt is CPU-bound but releases the GIL: run it on a bounded pool, off the event loop
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Created by auth_startup (None until then: the loop's default executor is used)
+hash_pool: ThreadPoolExecutor | None = None
 
 # FastAPI app
 app = FastAPI()
@@ -31,21 +53,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# DB connection pool
-pool: asyncpg.Pool | None = None
+# User storage (Postgres pool, or a local stand-in)
+users: UserRepository | None = None
 
 # --- Startup & Shutdown ---
 
 async def auth_startup():
-    """Initialize async DB pool with SSL."""
-    global pool
-    ssl_ctx = ssl.create_default_context()
-    pool = await asyncpg.create_pool(DATABASE_URL, ssl=ssl_ctx)
+    """Open the user repository (Postgres pool with SSL unless DATABASE_URL says otherwise) and the hashing pool."""
+    global users, hash_pool
+    hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    users = create_repository(DATABASE_URL)
+    await users.start()
 
 async def auth_shutdown():
-    """Close DB pool."""
-    if pool:
-        await pool.close()
+    """Close the user repository and the hashing pool (a later auth_startup opens new ones)."""
+    global hash_pool
+    if users:
+        await users.close()
+    if hash_pool is not None:
+        hash_pool.shutdown(wait=False)
+        hash_pool = None
 
 # --- Models ---
 
@@ -67,15 +94,62 @@ class User(BaseModel):
 
 # --- Auth helpers ---
 
-def create_token(sub: str):
-    """Create JWT token with expiration."""
+def create_token(sub: str, claims: dict | None = None):
+    """Create JWT token with expiration (plus any extra `claims`)."""
     exp = datetime.utcnow() + timedelta(minutes=TOKEN_MIN)
-    return jwt.encode({"sub": sub, "exp": exp}, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode({**(claims or {}), "sub": sub, "exp": exp}, SECRET_KEY, algorithm=ALGORITHM)
+
+class UserCache:
+    """In-process LRU of UserOut by user id; entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, size: int = USER_CACHE_SIZE):
+        self.ttl, self.size = ttl, size
+        self._users = OrderedDict()   # user id -> (expires at, UserOut)
+
+    def get(self, user_id: int):
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user) -> None:
+        if self.ttl <= 0:
+            return
+        self._users[user.id] = (time.monotonic() + self.ttl, user)
+        self._users.move_to_end(user.id)
+        while len(self._users) > self.size:
+            self._users.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """Forget one user (after it changed) or everyone."""
+        if user_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(user_id, None)
+
+user_cache = UserCache()
+
+def invalidate_user(user_id: int | None = None) -> None:
+    """Hook for code that updates or deletes users."""
+    user_cache.invalidate(user_id)
+
+async def hash_password(password: str) -> str:
+    """bcrypt hash computed on the hashing pool."""
+    return await asyncio.get_running_loop().run_in_executor(hash_pool, pwd_ctx.hash, password)
+
+async def verify_password(password: str, password_hash: str) -> tuple:
+    """(valid, new hash or None) computed on the hashing pool; a new hash means the cost changed."""
+    return await asyncio.get_running_loop().run_in_executor(
+        hash_pool, pwd_ctx.verify_and_update, password, password_hash
+    )
 
 async def get_user_by_id(user_id: int):
     """Fetch user by ID from DB."""
-    row = await pool.fetchrow("SELECT id, email, created_at FROM users WHERE id=$1", user_id)
-    return dict(row) if row else None
+    return await users.get_by_id(user_id)
 
 async def current_user(request: Request) -> UserOut:
     """Get logged-in user from cookie token."""
@@ -87,33 +161,47 @@ async def current_user(request: Request) -> UserOut:
         user_id = int(payload.get("sub"))
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    # Fast paths: signed claims, then the user cache
+    if TRUST_TOKEN_CLAIMS and "email" in payload and "created_at" in payload:
+        return UserOut(id=user_id, email=payload["email"], created_at=payload["created_at"])
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
     user = await get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return UserOut(**user)
+    user = UserOut(**user)
+    user_cache.put(user)
+    return user
 
 # --- Routes ---
 
 @app.post("/register", status_code=201)
 async def register(body: RegisterIn):
     """Register new user with hashed password."""
-    hashed = pwd_ctx.hash(body.password)
+    hashed = await hash_password(body.password)
     try:
-        row = await pool.fetchrow(
-            "INSERT INTO users (email, password_hash) VALUES ($1, $2) RETURNING id, email, created_at",
-            body.email, hashed
-        )
-        return {"user": dict(row)}
-    except asyncpg.UniqueViolationError:
+        return {"user": await users.create(body.email, hashed)}
+    except DuplicateEmailError:
         raise HTTPException(status_code=409, detail="Email already registered")
 
 @app.post("/login")
 async def login(body: LoginIn, response: Response):
     """Login user, set JWT in cookie."""
-    row = await pool.fetchrow("SELECT id, password_hash FROM users WHERE email=$1", body.email)
-    if not row or not pwd_ctx.verify(body.password, row["password_hash"]):
+    row = await users.get_by_email(body.email)
+    if not row:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_token(str(row["id"]))
+    valid, new_hash = await verify_password(body.password, row["password_hash"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Upgrade the stored hash to the current BCRYPT_ROUNDS
+        await users.set_password_hash(row["id"], new_hash)
+    user = UserOut(id=row["id"], email=row["email"], created_at=row["created_at"])
+    user_cache.put(user)
+    token = create_token(str(row["id"]), {"email": user.email, "created_at": user.created_at.isoformat()})
     response.set_cookie(
         key="access_token",
         value=token,
@@ -136,11 +224,29 @@ async def me(user: UserOut = Depends(current_user)):
     """Get current logged-in user info."""
     return user
 
-@app.post("/send-email")
+@app.get("/db-metrics")
+def db_metrics():
+    """User repository metrics (pool size, in use, waiters, acquire time)."""
+    return users.metrics() if users else {}
+
+@app.post("/send-email", status_code=202)
 def send_email():
-    """Manually trigger email report send."""
+    """Queue the email report; returns the outbox job to poll."""
     try:
-        send_email_report()
-        return {"message": "Email sent successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job = email_outbox.enqueue()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Email queued", "job_id": job["id"], "status": job["status"]}
+
+@app.get("/send-email/{job_id}")
+def send_email_status(job_id: int):
+    """Delivery status of a queued email report."""
+    job = email_outbox.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/email-outbox")
+def email_outbox_status():
+    """Outbox job counts per status and the most recent jobs."""
+    return email_outbox.status()
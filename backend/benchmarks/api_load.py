@@ -0,0 +1,237 @@
+"""Load test for the FastAPI backend, with local stand-ins for Postgres and SMTP.
+
+Run from backend/:
+
+    python -m benchmarks.api_load --concurrency 16 --requests 200
+    python -m benchmarks.api_load --save benchmarks/api_baseline.json
+    python -m benchmarks.api_load --baseline benchmarks/api_baseline.json
+
+The app from app.py is served by uvicorn on a local port. Users live in the
+in-memory user repository. Emails go through the outbox and are built and
+serialized, but not sent.
+Settings, scheduler, outbox and artifact-cache files go to a temporary
+directory, so the real settings.json is never touched. export_ppt and
+send_email write the usual report files (report.pptx, chart.png, ...),
+which are restored after the run.
+
+Every settings save uses a new days_back, so its report rebuild can't be
+served from the artifact cache. put_settings only times the save itself
+(PUT /settings returns once the rebuild is queued); settings_rebuild also
+polls /reports/jobs/{id} until the reports for that save are built.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.common import add_baseline_args, finish, latency_summary
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ("get_settings", "put_settings", "settings_rebuild", "login", "me", "export_ppt", "schedule_email", "send_email")
+
+# Written by the report scenarios; saved before the run and put back afterwards
+REPORT_FILES = ("report.pptx", "report.xlsx", "chart.png", "report.pdf")
+
+# days_back values for settings saves (never repeated within a run)
+_DAYS_BACK = itertools.count(1)
+
+# Seconds between report job status checks in settings_rebuild
+JOB_POLL_INTERVAL = 0.02
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _configure(tmp: Path, bcrypt_rounds: int) -> None:
+    """Point every stateful dependency at stand-ins before the app is imported."""
+    os.environ["DATABASE_URL"] = "memory://"
+    os.environ["SCHEDULER_DB_URL"] = f"sqlite:///{tmp / 'scheduler.db'}"
+    os.environ["EMAIL_OUTBOX_PATH"] = str(tmp / "outbox.db")
+    os.environ["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+
+def _start_app(tmp: Path, port: int):
+    """Import app.py with the stand-ins in place and serve it on a background thread."""
+    from contextlib import asynccontextmanager
+    import uvicorn
+    import app as backend
+    from auth_service import auth_shutdown, auth_startup
+    from project_pipeline import artifact_cache, data_store, email_service, report_pipeline, scheduler_service
+    from project_pipeline.email_outbox import email_outbox
+
+    class LocalSMTPPool(email_service.SMTPPool):
+        """Serializes each message like a real send, without a server."""
+
+        def __init__(self):
+            super().__init__(security="none")
+            self.sent = 0
+
+        def send(self, msg) -> None:
+            msg.as_bytes()
+            self.sent += 1
+
+    # Settings/profiles copies with the bench user as the only recipient
+    shutil.copy(data_store.SETTINGS_PATH, tmp / "settings.json")
+    data_store.SETTINGS_PATH = tmp / "settings.json"
+    data_store.PROFILES_PATH = tmp / "profiles.json"
+    settings = data_store.get_settings()
+    settings.mailing_list = BENCH_EMAIL
+    data_store.write_settings(settings)
+    email_service.smtp_pool = LocalSMTPPool()
+    artifact_cache.CACHE_DIR = tmp / "artifacts"
+    report_pipeline.REPORTS_DIR = tmp / "reports"
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # As app.lifespan, minus the startup data cleaning and report rebuild
+        await email_outbox.start()
+        scheduler_service.start_scheduler()
+        await auth_startup()   # DATABASE_URL=memory://
+        yield
+        scheduler_service.stop_scheduler()
+        await email_outbox.stop()
+        await auth_shutdown()
+
+    backend.app.router.lifespan_context = lifespan
+    server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Benchmark server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+async def _wait_for_report_job(client, response):
+    """Poll the report job started by a settings save until it (or the save that replaced it) is built."""
+    job_id = response.headers.get("X-Report-Job-Id")
+    while job_id is not None:
+        response = await client.get(f"/reports/jobs/{job_id}")
+        if response.status_code >= 400:
+            return response
+        job = response.json()
+        if job["status"] == "superseded":
+            # Queued saves are coalesced: the later save's build covers this one
+            job_id = job["superseded_by"]
+        elif job["status"] == "failed":
+            raise RuntimeError(f"Report job {job_id} failed: {job.get('error')}")
+        elif job["status"] == "done":
+            return response
+        else:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    return response
+
+async def _request(client, scenario: str, settings_body: dict):
+    if scenario == "get_settings":
+        return await client.get("/settings")
+    if scenario in ("put_settings", "settings_rebuild"):
+        # A new report window every time, so the rebuild can't come from the artifact cache
+        response = await client.put("/settings", json={**settings_body, "days_back": next(_DAYS_BACK)})
+        if scenario == "settings_rebuild" and response.status_code < 400:
+            response = await _wait_for_report_job(client, response)
+        return response
+    if scenario == "login":
+        return await client.post("/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    if scenario == "me":
+        return await client.get("/auth/me")
+    if scenario == "export_ppt":
+        return await client.post("/export-ppt")
+    if scenario == "schedule_email":
+        return await client.post("/schedule-email")
+    if scenario == "send_email":
+        return await client.post("/auth/send-email")
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+async def _run_scenario(client, scenario: str, requests: int, concurrency: int, settings_body: dict) -> dict:
+    """Send `requests` requests from `concurrency` concurrent workers."""
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await _request(client, scenario, settings_body)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latency_summary(latencies, time.perf_counter() - started, errors)
+
+async def _drive(base_url: str, scenarios: list, requests: int, concurrency: int, warmup: int) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        # A user to log in as, and a session cookie for /auth/me
+        await client.post("/auth/register", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+        (await client.post("/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})).raise_for_status()
+        settings_body = (await client.get("/settings")).json()
+
+        results = {}
+        for scenario in scenarios:
+            for _ in range(warmup):
+                await _request(client, scenario, settings_body)
+            results[f"api:{scenario}"] = await _run_scenario(client, scenario, requests, concurrency, settings_body)
+            print(f"{scenario}: {results[f'api:{scenario}']}")
+        return results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent client workers")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests before each scenario")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="BCRYPT_ROUNDS for the login scenario")
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    with tempfile.TemporaryDirectory(prefix="kpi-bench-") as tmp:
+        tmp = Path(tmp)
+        saved = [name for name in REPORT_FILES if (BACKEND_DIR / name).exists()]
+        for name in saved:
+            shutil.copy2(BACKEND_DIR / name, tmp / name)
+        _configure(tmp, args.bcrypt_rounds)
+        port = _free_port()
+        server, thread = _start_app(tmp, port)
+        try:
+            results = asyncio.run(_drive(f"http://127.0.0.1:{port}", scenarios, args.requests, args.concurrency, args.warmup))
+        finally:
+            from project_pipeline.report_jobs import report_jobs
+            server.should_exit = True
+            thread.join(timeout=30)
+            report_jobs.wait_idle(timeout=60)
+            report_jobs.stop()
+            for name in REPORT_FILES:
+                if name in saved:
+                    shutil.copy2(tmp / name, BACKEND_DIR / name)
+                else:
+                    (BACKEND_DIR / name).unlink(missing_ok=True)
+    return finish(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
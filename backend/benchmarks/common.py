@@ -0,0 +1,82 @@
+import json
+import math
+import statistics
+from pathlib import Path
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of `values` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def latency_summary(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    """Throughput and latency percentiles (ms) for one scenario."""
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+    }
+
+def timing_summary(durations: list) -> dict:
+    """Best/median wall time (ms) over repeated runs."""
+    return {
+        "runs": len(durations),
+        "best_ms": round(1000 * min(durations), 2),
+        "median_ms": round(1000 * statistics.median(durations), 2),
+    }
+
+def print_table(results: dict) -> None:
+    """Print {name: {metric: value}} as an aligned table."""
+    if not results:
+        return
+    metrics = list(next(iter(results.values())))
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  " + "  ".join(f"{m:>10}" for m in metrics))
+    for name, row in results.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{row.get(m, ''):>10}" for m in metrics))
+
+def save_results(path: Path, results: dict) -> None:
+    Path(path).write_text(json.dumps(results, indent=2))
+    print(f"Results saved to {path}")
+
+# Metrics where a larger value is a regression (everything else is throughput)
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "best_ms", "median_ms", "errors")
+
+def find_regressions(results: dict, baseline_path: Path, tolerance: float) -> list:
+    """Compare with a saved baseline; returns a message per metric worse by more than `tolerance`."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressions = []
+    for name, row in results.items():
+        for metric, base in baseline.get(name, {}).items():
+            value = row.get(metric)
+            if value is None or not isinstance(base, (int, float)) or metric in ("requests", "runs"):
+                continue
+            if metric in LOWER_IS_BETTER:
+                worse = value > base * (1 + tolerance) and value - base > 1e-9
+            else:
+                worse = value < base * (1 - tolerance)
+            if worse:
+                regressions.append(f"{name} {metric}: {base} -> {value}")
+    return regressions
+
+def add_baseline_args(parser) -> None:
+    parser.add_argument("--save", type=Path, help="write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", type=Path, help="compare with a saved baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+
+def finish(results: dict, args) -> int:
+    """Print, save and compare results; returns the process exit code."""
+    print_table(results)
+    if args.save:
+        save_results(args.save, results)
+    if args.baseline:
+        regressions = find_regressions(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
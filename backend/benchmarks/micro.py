@@ -0,0 +1,157 @@
+"""Micro-benchmarks for the data pipeline on synthetic data.
+
+Run from backend/:
+
+    python -m benchmarks.micro                       # 1k, 100k and 1M raw rows
+    python -m benchmarks.micro --rows 10M --only clean
+    python -m benchmarks.micro --rows 10M --sites 20000 --only clean
+    python -m benchmarks.micro --save benchmarks/micro_baseline.json
+    python -m benchmarks.micro --baseline benchmarks/micro_baseline.json
+
+Benchmarks:
+  clean    clean_and_aggregate on a raw CSV: whole file, chunked, and an
+           incremental run after ~1% more rows are appended
+  equation safe_eval_equation on a frame of the same number of rows
+  report   the Excel report (report.xlsx + chart.png) for --report-days days
+           of history, built without the artifact cache
+
+Raw data comes from dataset_generator.py (random and per-site missing
+values). Everything is written to a temporary directory.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import add_baseline_args, finish, timing_summary
+from dataset_generator import KPI_COLUMNS, generate_dataset
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+BENCHMARKS = ("clean", "equation", "report")
+
+EQUATION = "kpi001 + kpi002 + kpi003 + kpi004 + (kpi005/1000) +(kpi006/1000)"
+# Early enough for 10M rows at 1000 sites (27 years) or 100k-day reports
+START_DATE = pd.Timestamp("1800-01-01")
+
+def parse_size(text: str) -> int:
+    """"1k" -> 1000, "1M" -> 1000000."""
+    text = text.strip()
+    scale = {"k": 1_000, "K": 1_000, "m": 1_000_000, "M": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+def size_label(n: int) -> str:
+    for scale, suffix in ((1_000_000, "M"), (1_000, "k")):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{suffix}"
+    return str(n)
+
+def _layout(rows: int, sites: int | None) -> tuple:
+    """(sites, days) giving about `rows` raw rows (by default about a year of history or more)."""
+    sites = sites or max(1, min(1000, rows // 365))
+    return sites, -(-rows // sites)
+
+def _day(n: int) -> str:
+    return (START_DATE + pd.Timedelta(days=n)).strftime("%Y-%m-%d")
+
+def _timed(fn, repeat: int, setup=None) -> dict:
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return timing_summary(durations)
+
+def bench_clean(tmp: Path, rows: int, repeat: int, sites: int | None = None) -> dict:
+    from data_cleaner import DEFAULT_CHUNKSIZE, clean_and_aggregate
+
+    sites, days = _layout(rows, sites)
+    raw = tmp / f"raw_{rows}.csv"
+    generate_dataset(raw, sites, days, start=_day(0))
+    out = tmp / f"clean_{rows}" / "cleaned_dataset.csv"
+    out.parent.mkdir()
+
+    label = size_label(rows)
+    results = {
+        f"clean:full:{label}": _timed(lambda: clean_and_aggregate(raw, out), repeat),
+        f"clean:chunked:{label}": _timed(lambda: clean_and_aggregate(raw, out, chunksize=DEFAULT_CHUNKSIZE), repeat),
+    }
+
+    # Incremental: each run only parses the days appended since the previous one
+    inc = tmp / f"clean_{rows}" / "incremental.csv"
+    clean_and_aggregate(raw, inc, incremental=True)
+    new_days = max(1, days // 100)
+    appended = [days]
+
+    def append():
+        generate_dataset(raw, sites, new_days, append=True, start=_day(appended[0]))
+        appended[0] += new_days
+
+    results[f"clean:incremental:{label}"] = _timed(lambda: clean_and_aggregate(raw, inc, incremental=True), repeat, setup=append)
+    return results
+
+def bench_equation(rows: int, repeat: int) -> dict:
+    from project_pipeline.excel_export import safe_eval_equation
+
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(rng.gamma(2.0, 50.0, size=(rows, len(KPI_COLUMNS))), columns=KPI_COLUMNS)
+    safe_eval_equation(frame, EQUATION)   # compile once, as the report builders do
+    return {f"equation:{size_label(rows)}": _timed(lambda: safe_eval_equation(frame, EQUATION), repeat)}
+
+def bench_report(tmp: Path, days: int, repeat: int) -> dict:
+    from data_cleaner import clean_and_aggregate
+    from project_pipeline import data_store
+    from project_pipeline.report_pipeline import PngSink, ReportPipeline, XlsxSink
+
+    # A cleaned dataset of `days` dates for the report builders to read
+    work = tmp / f"report_{days}"
+    work.mkdir()
+    generate_dataset(work / "raw.csv", 10, days, start=_day(0))
+    cleaned = work / "cleaned_dataset.csv"
+    clean_and_aggregate(work / "raw.csv", cleaned)
+    data_store.DATASET_PATH = cleaned
+    data_store.COLUMNAR_PATH = cleaned.with_suffix(".parquet")
+    data_store.ROLLUP_PATHS = {g: cleaned.with_suffix(f".{g}.parquet") for g in data_store.ROLLUP_PATHS}
+
+    settings = data_store.get_settings().model_copy(update={"days_back": days, "start_date": None, "end_date": None})
+    pipeline = ReportPipeline([XlsxSink(work / "report.xlsx"), PngSink(work / "chart.png")])
+    return {f"report:{size_label(days)}d": _timed(lambda: pipeline.run(settings, use_cache=False), repeat)}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1k,100k,1M", help="raw row counts for clean/equation (e.g. 1k,100k,1M,10M)")
+    parser.add_argument("--sites", type=int, help="sites in the raw data (default: up to 1000, about a year of history)")
+    parser.add_argument("--report-days", default="30,365,3650", help="days of history for the report benchmark")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma-separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    only = {b.strip() for b in args.only.split(",") if b.strip()}
+    if only - set(BENCHMARKS):
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(only - set(BENCHMARKS)))}")
+    sizes = [parse_size(s) for s in args.rows.split(",") if s.strip()]
+    report_days = [parse_size(s) for s in args.report_days.split(",") if s.strip()]
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="kpi-micro-") as tmp:
+        tmp = Path(tmp)
+        for rows in sizes:
+            if "clean" in only:
+                results.update(bench_clean(tmp, rows, args.repeat, args.sites))
+            if "equation" in only:
+                results.update(bench_equation(rows, args.repeat))
+        if "report" in only:
+            for days in report_days:
+                results.update(bench_report(tmp, days, args.repeat))
+    return finish(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
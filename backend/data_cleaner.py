@@ -1,29 +1,461 @@
 import pandas as pd
+from contextlib import contextmanager
 from pathlib import Path
+import hashlib
+import io
+import json
+import os
+import shutil
 
-def clean_and_aggregate(input_path: str, output_path: str) -> pd.DataFrame:
-    """Clean raw dataset and aggregate KPI values by date."""
-    
-    # Load raw CSV
-    df = pd.read_csv(input_path)
+from project_pipeline.rollups import ROLLUP_PERIODS, update_rollup
+from project_pipeline.site_store import MANIFEST_NAME, store_parts
 
-    # Standardize column names
-    df.rename(columns={df.columns[0]: "date", df.columns[1]: "sitecode"}, inplace=True)
-    df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors="coerce")
+# Rows per chunk in streaming mode (peak memory is bounded by this, not the file size)
+DEFAULT_CHUNKSIZE = 200_000
 
-    # KPI columns = everything except date & sitecode
-    kpi_cols = [col for col in df.columns if col not in ["date", "sitecode"]]
+# Incremental runs append small site-store parts; compact once there are more than this
+SITE_STORE_MAX_PARTS = 32
 
-    # 1: Aggregate by date (sum KPIs across sites)
-    agg_df = df.groupby("date", as_index=False)[kpi_cols].sum(min_count=1)
-    # (min_count=1 → keep NaN if all values are NaN instead of replacing with 0)
+# Rows per record batch when compacting the site store
+SITE_STORE_BATCH_ROWS = 65_536
+
+# Sums of the same rows added in a different order (whole file, chunks, increments)
+# differ in the last bits; 12 significant digits write them identically
+CSV_FLOAT_FORMAT = "%.12g"
+
+# Bytes hashed just before the watermark to detect a rewritten (not appended) raw file
+FINGERPRINT_BYTES = 4096
+
+class _ByteRange:
+    """Read-only view over a binary file up to `end`, so pandas stops at the watermark."""
+
+    def __init__(self, f, end: int):
+        self._f = f
+        self._end = end
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._end - self._f.tell()
+        if remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self._f.read(size)
+
+    def __iter__(self):
+        return iter(self.read().splitlines(keepends=True))
+
+def _read_columns(input_path: str) -> list:
+    """Read only the header row of the raw CSV."""
+    return list(pd.read_csv(input_path, nrows=0).columns)
+
+def _chunk_dtypes(columns: list) -> dict:
+    """Explicit dtypes so pandas never infers (or upcasts) a whole chunk.
+
+    KPIs are float64 like the whole-file path, so both write the same values
+    (memory is already bounded by the chunk size).
+    """
+    dtypes = {columns[0]: "string", columns[1]: "category"}
+    dtypes.update({col: "float64" for col in columns[2:]})
+    return dtypes
+
+class _SiteStoreWriter:
+    """Writes per-(date, site) KPI rows as Parquet parts in `<output>.sites/`.
+
+    Parts are sorted by date then site so readers can prune by date range
+    from the row-group statistics. Site codes are dictionary-encoded strings
+    and KPIs are float32. New parts are only visible to readers once
+    commit() lists them in the manifest.
+    """
+
+    def __init__(self, store_dir: Path, reset: bool):
+        self.store_dir = store_dir
+        if reset:
+            shutil.rmtree(store_dir, ignore_errors=True)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        self.enabled = True
+        committed = store_parts(store_dir)
+        if committed is None:
+            committed = sorted(store_dir.glob("part-*.parquet"))
+        self._parts = [p.name for p in committed]
+        self._obsolete = []
+        # Parts of a run that crashed before committing were never visible: remove them
+        for p in store_dir.glob("part-*.parquet"):
+            if p.name not in self._parts:
+                p.unlink()
+        self._next = max((int(name[5:10]) for name in self._parts), default=-1) + 1
+
+    def parts(self) -> list:
+        return [self.store_dir / name for name in self._parts]
+
+    def _new_part(self) -> Path:
+        path = self.store_dir / f"part-{self._next:05d}.parquet"
+        self._next += 1
+        return path
+
+    def write(self, chunk: pd.DataFrame, kpi_cols: list) -> None:
+        if not self.enabled:
+            return
+        rows = chunk.loc[chunk["date"].notna(), ["date", "sitecode"] + kpi_cols]
+        if rows.empty:
+            return
+        rows = rows.astype({"sitecode": "string", **{col: "float32" for col in kpi_cols}})
+        rows = rows.sort_values(["date", "sitecode"], kind="stable")
+        try:
+            path = self._new_part()
+            rows.to_parquet(path, index=False)
+            self._parts.append(path.name)
+        except ImportError:
+            print("pyarrow not installed, skipping per-site store")
+            self.enabled = False
+
+    def compact(self) -> None:
+        """Merge all parts into a new one, streaming record batches (memory is bounded by a batch, not the store).
+
+        Each part keeps its own date-sorted row groups, so date pruning still
+        works. The old parts are deleted by commit(), once the manifest no
+        longer lists them.
+        """
+        parts = self.parts()
+        if not self.enabled or len(parts) <= SITE_STORE_MAX_PARTS:
+            return
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        dataset = ds.dataset([str(p) for p in parts], format="parquet")
+        merged = self._new_part()
+        with pq.ParquetWriter(merged, dataset.schema) as writer:
+            for batch in dataset.to_batches(batch_size=SITE_STORE_BATCH_ROWS):
+                writer.write_batch(batch)
+        self._obsolete.extend(self._parts)
+        self._parts = [merged.name]
+
+    def commit(self) -> None:
+        """Make the current parts the visible store (atomic manifest switch), then delete replaced parts.
+
+        A crash before the switch leaves the previous store intact; a crash
+        after it only leaves unlisted parts behind, removed by the next writer.
+        """
+        tmp = self.store_dir / f"{MANIFEST_NAME}.tmp"
+        tmp.write_text(json.dumps({"parts": self._parts}), encoding="utf-8")
+        os.replace(tmp, self.store_dir / MANIFEST_NAME)
+        for name in self._obsolete:
+            (self.store_dir / name).unlink(missing_ok=True)
+        self._obsolete = []
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive lock on `path` shared by every process (blocks until it is free)."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue   # LK_LOCK gives up after ~10 s; keep waiting
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _site_store_path(output_path: str) -> Path:
+    """Per-site KPI store lives next to the cleaned CSV."""
+    return Path(output_path).with_suffix(".sites")
+
+def _fold_chunks(reader, columns: list, site_store: _SiteStoreWriter | None = None):
+    """Fold CSV chunks into running per-date KPI sums and non-null counts."""
+    date_col, site_col = columns[0], columns[1]
+    kpi_cols = columns[2:]
+    sums, counts = None, None
+
+    for chunk in reader:
+        chunk.rename(columns={date_col: "date", site_col: "sitecode"}, inplace=True)
+        chunk["date"] = pd.to_datetime(chunk["date"], dayfirst=True, errors="coerce")
+
+        # Keep the per-site detail before it is summed away
+        if site_store is not None:
+            site_store.write(chunk, kpi_cols)
+
+        grouped = chunk[kpi_cols].groupby(chunk["date"])
+        chunk_sums, chunk_counts = grouped.sum(), grouped.count()
+
+        if sums is None:
+            sums, counts = chunk_sums, chunk_counts
+        else:
+            sums = sums.add(chunk_sums, fill_value=0)
+            counts = counts.add(chunk_counts, fill_value=0)
+
+    return sums, counts
+
+def _finalize(sums, counts, kpi_cols: list) -> pd.DataFrame:
+    """Turn running sums/counts into the per-date aggregate frame."""
+    if sums is None:
+        return pd.DataFrame(columns=["date"] + kpi_cols)
+
+    # Same as sum(min_count=1): a date with no values for a KPI stays NaN
+    agg_df = sums.where(counts > 0).sort_index()
+    agg_df.index.name = "date"
+    return agg_df.reset_index()
+
+def _aggregate_in_chunks(input_path: str, chunksize: int, site_store: _SiteStoreWriter | None = None) -> pd.DataFrame:
+    """Stream the raw CSV in chunks and aggregate KPI values by date."""
+    columns = _read_columns(input_path)
+    reader = pd.read_csv(input_path, dtype=_chunk_dtypes(columns), chunksize=chunksize)
+    sums, counts = _fold_chunks(reader, columns, site_store)
+    return _finalize(sums, counts, columns[2:])
+
+# --- Incremental mode ---
+
+def _columnar_path(output_path: str) -> Path:
+    """Typed columnar copy of the cleaned CSV (read by the report builders)."""
+    return Path(output_path).with_suffix(".parquet")
+
+def _write_columnar(agg_df: pd.DataFrame, output_path: str) -> None:
+    """Write the Parquet copy of the cleaned dataset (skipped if pyarrow is missing)."""
+    try:
+        agg_df.to_parquet(_columnar_path(output_path), index=False)
+    except ImportError:
+        print("pyarrow not installed, skipping columnar cache")
+
+def _rollup_path(output_path: str, granularity: str) -> Path:
+    """Materialized weekly/monthly rollups live next to the cleaned CSV."""
+    return Path(output_path).with_suffix(f".{granularity}.parquet")
+
+def _write_rollups(agg_df: pd.DataFrame, output_path: str, since=None) -> None:
+    """Write weekly/monthly rollups; with `since` only the periods from that date on are recomputed."""
+    for granularity in ROLLUP_PERIODS:
+        path = _rollup_path(output_path, granularity)
+        try:
+            existing = pd.read_parquet(path) if since is not None and path.exists() else None
+            update_rollup(existing, agg_df, granularity, since).to_parquet(path, index=False)
+        except ImportError:
+            print("pyarrow not installed, skipping rollups")
+            return
+
+def _state_path(output_path: str) -> Path:
+    """Aggregation state lives next to the cleaned CSV."""
+    return Path(output_path).with_suffix(".state.json")
+
+def _load_state(path: Path):
+    """Load the persisted aggregation state (None if missing or unreadable)."""
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _save_state(path: Path, state: dict) -> None:
+    """Write state atomically so a crash never leaves a half-written file."""
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, path)
+
+def _state_frames(state: dict):
+    """Rebuild the running sums/counts frames from a persisted state."""
+    index = pd.DatetimeIndex(pd.to_datetime(state["dates"]), name="date")
+    kpi_cols = state["columns"][2:]
+    sums = pd.DataFrame(state["sums"], index=index, columns=kpi_cols, dtype="float64")
+    counts = pd.DataFrame(state["counts"], index=index, columns=kpi_cols, dtype="int64")
+    return sums, counts
+
+def _fingerprint(f, offset: int) -> str:
+    """Hash the bytes just before `offset`."""
+    start = max(0, offset - FINGERPRINT_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+def _last_line_end(f, size: int) -> int:
+    """Offset just past the last complete line (a partially written row is left for next time)."""
+    pos = size
+    while pos > 0:
+        start = max(0, pos - 65536)
+        f.seek(start)
+        newline = f.read(pos - start).rfind(b"\n")
+        if newline != -1:
+            return start + newline + 1
+        pos = start
+    return 0
+
+def _rewrite_tail(output_path: str, agg_df: pd.DataFrame, first_date: pd.Timestamp) -> None:
+    """Rewrite only the rows of the cleaned CSV from `first_date` onwards."""
+    first_key = first_date.strftime("%Y-%m-%d")
+    with open(output_path, "r+b") as f:
+        f.readline()  # header
+        cut = f.tell()
+        for line in iter(f.readline, b""):
+            if line.split(b",", 1)[0].decode() >= first_key:
+                break
+            cut = f.tell()
+        f.seek(cut)
+        f.truncate()
+        tail = agg_df[agg_df["date"] >= first_date]
+        f.write(tail.to_csv(index=False, header=False, float_format=CSV_FLOAT_FORMAT).encode())
+
+def _clean_incremental(input_path: str, output_path: str, chunksize: int) -> pd.DataFrame:
+    """Only parse raw rows appended since the last run and merge them into the aggregate."""
+    columns = _read_columns(input_path)
+    kpi_cols = columns[2:]
+    state_path = _state_path(output_path)
+    state = _load_state(state_path)
+
+    with open(input_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = _last_line_end(f, size)
+
+        # Trust the state only if the raw file was appended to, not rewritten
+        resume = (
+            state is not None
+            and state.get("columns") == columns
+            and state.get("offset", 0) <= end
+            and _fingerprint(f, state["offset"]) == state.get("fingerprint")
+        )
+        if resume:
+            start = state["offset"]
+            sums, counts = _state_frames(state)
+        else:
+            f.seek(0)
+            f.readline()  # header
+            start = f.tell()
+            sums, counts = None, None
+
+        new_sums = None
+        site_store = _SiteStoreWriter(_site_store_path(output_path), reset=not resume)
+        if end > start:
+            f.seek(start)
+            reader = pd.read_csv(
+                _ByteRange(f, end),
+                header=None,
+                names=columns,
+                dtype=_chunk_dtypes(columns),
+                chunksize=chunksize,
+            )
+            new_sums, new_counts = _fold_chunks(reader, columns, site_store)
+            site_store.compact()
+
+        fingerprint = _fingerprint(f, max(end, start))
+
+        # A last row without a trailing newline goes into the output, but not into
+        # the saved state: it is parsed again once it is complete
+        tail_sums = None
+        if size > max(end, start):
+            f.seek(max(end, start))
+            tail = pd.read_csv(io.BytesIO(f.read(size - max(end, start))), header=None, names=columns, dtype=_chunk_dtypes(columns))
+            tail_sums, tail_counts = _fold_chunks([tail], columns)
+
+    if new_sums is not None:
+        if sums is None:
+            sums, counts = new_sums, new_counts
+        else:
+            sums = sums.add(new_sums, fill_value=0)
+            counts = counts.add(new_counts, fill_value=0)
+
+    # Publish the new site rows, then persist partial sums, counts and the byte watermark
+    site_store.commit()
+    if sums is not None:
+        sums, counts = sums.sort_index(), counts.sort_index()
+    _save_state(state_path, {
+        "columns": columns,
+        "offset": max(end, start),
+        "fingerprint": fingerprint,
+        "dates": [d.strftime("%Y-%m-%d") for d in sums.index] if sums is not None else [],
+        "sums": sums.values.tolist() if sums is not None else [],
+        "counts": counts.astype("int64").values.tolist() if counts is not None else [],
+        "tail_from": tail_sums.index.min().strftime("%Y-%m-%d") if tail_sums is not None and len(tail_sums.index) else None,
+    })
+
+    if tail_sums is not None:
+        sums = tail_sums if sums is None else sums.add(tail_sums, fill_value=0)
+        counts = tail_counts if counts is None else counts.add(tail_counts, fill_value=0)
+
+    agg_df = _finalize(sums, counts, kpi_cols)
+    agg_df = agg_df.dropna(how="all", subset=kpi_cols)
+
+    # Dates whose output rows changed: new rows, and unterminated rows from this run or the last
+    changed = [
+        d for d in (
+            new_sums.index.min() if new_sums is not None and len(new_sums.index) else None,
+            tail_sums.index.min() if tail_sums is not None and len(tail_sums.index) else None,
+            pd.Timestamp(state["tail_from"]) if resume and state.get("tail_from") else None,
+        ) if d is not None and not pd.isna(d)
+    ]
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    if resume and Path(output_path).exists():
+        if changed:
+            _rewrite_tail(output_path, agg_df, min(changed))
+            _write_rollups(agg_df, output_path, since=min(changed))
+    else:
+        agg_df.to_csv(output_path, index=False, float_format=CSV_FLOAT_FORMAT)
+        _write_rollups(agg_df, output_path)
+    _write_columnar(agg_df, output_path)
+
+    return agg_df
+
+def clean_and_aggregate(
+    input_path: str,
+    output_path: str,
+    chunksize: int | None = None,
+    incremental: bool = False,
+) -> pd.DataFrame:
+    """Clean raw dataset and aggregate KPI values by date.
+
+    If `chunksize` is given the raw CSV is streamed in chunks of that many rows
+    instead of being loaded whole. With `incremental=True` only rows appended
+    since the previous run are parsed (state is kept in `<output>.state.json`).
+    A Parquet copy is also written to `<output>.parquet` for the report builders,
+    the per-(date, site) rows are kept in `<output>.sites/` for site queries, and
+    weekly/monthly rollups are materialized in `<output>.<granularity>.parquet`.
+    """
+
+    # Several API workers run this at startup: one at a time per output
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with _file_lock(Path(output_path).with_suffix(".lock")):
+        if incremental:
+            return _clean_incremental(input_path, output_path, chunksize or DEFAULT_CHUNKSIZE)
+        return _clean_full(input_path, output_path, chunksize)
+
+def _clean_full(input_path: str, output_path: str, chunksize: int | None) -> pd.DataFrame:
+    """Rebuild every output from the whole raw file."""
+    # The incremental state describes the site store reset below: the next
+    # incremental run must start over instead of appending from its old offset
+    _state_path(output_path).unlink(missing_ok=True)
+    site_store = _SiteStoreWriter(_site_store_path(output_path), reset=True)
+    if chunksize:
+        agg_df = _aggregate_in_chunks(input_path, chunksize, site_store)
+        kpi_cols = [col for col in agg_df.columns if col != "date"]
+    else:
+        # Load raw CSV
+        df = pd.read_csv(input_path)
+
+        # Standardize column names
+        df.rename(columns={df.columns[0]: "date", df.columns[1]: "sitecode"}, inplace=True)
+        df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors="coerce")
+
+        # KPI columns = everything except date & sitecode
+        kpi_cols = [col for col in df.columns if col not in ["date", "sitecode"]]
+        site_store.write(df, kpi_cols)
+
+        # 1: Aggregate by date (sum KPIs across sites)
+        agg_df = df.groupby("date", as_index=False)[kpi_cols].sum(min_count=1)
+        # (min_count=1 → keep NaN if all values are NaN instead of replacing with 0)
 
     # 2: Drop rows with no KPI data at all
     agg_df = agg_df.dropna(how="all", subset=kpi_cols)
 
     # Save cleaned dataset
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    agg_df.to_csv(output_path, index=False)
+    agg_df.to_csv(output_path, index=False, float_format=CSV_FLOAT_FORMAT)
+    _write_columnar(agg_df, output_path)
+    _write_rollups(agg_df, output_path)
+    site_store.commit()
 
     return agg_df
 
@@ -32,5 +464,5 @@ if __name__ == "__main__":
     BASE_DIR = Path(__file__).resolve().parent.parent
     input_file = BASE_DIR / "dataset.csv"                        # Raw input
     output_file = BASE_DIR / "backend" / "cleaned_dataset.csv"   # Cleaned output
-    cleaned_agg_df = clean_and_aggregate(input_file, output_file)
+    cleaned_agg_df = clean_and_aggregate(input_file, output_file, incremental=True)
     print(f"Cleaned and aggregated dataset saved to: {output_file}")
@@ -0,0 +1,177 @@
+"""Synthetic raw KPI exports for load tests and benchmarks.
+
+Writes files in the raw layout clean_and_aggregate() reads: date
+(dd/mm/YYYY), site code, kpi001..kpi009, one row per site per day, sorted
+by date. Rows are generated and written a block of days at a time, so
+memory stays bounded for any number of sites and days.
+
+    python dataset_generator.py ../dataset.csv --sites 20000 --days 1095
+    python dataset_generator.py raw.parquet --sites 50000 --days 365 --empty-sites 0.05
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+KPI_COLUMNS = [f"kpi{i:03d}" for i in range(1, 10)]
+DATE_FORMAT = "%d/%m/%Y"
+
+# Rows generated (and held in memory) per written block
+DEFAULT_CHUNK_ROWS = 500_000
+
+# Excel sheet limit, minus the header row
+XLSX_MAX_ROWS = 1_048_575
+
+FORMATS = (".csv", ".parquet", ".xlsx")
+
+class _SiteProfile:
+    """Per-site KPI scale and missingness, fixed by the seed so every block (and append) agrees."""
+
+    def __init__(self, sites: int, seed: int, empty_sites: float, partial_sites: float):
+        rng = np.random.default_rng(seed)
+        self.codes = np.array([f"S{i:05d}" for i in range(sites)])
+        # Typical daily value of each KPI at each site
+        self.scale = rng.lognormal(mean=4.0, sigma=1.0, size=(sites, len(KPI_COLUMNS))).astype("float32")
+        # Empty sites report rows with no KPI values at all
+        self.empty = rng.random(sites) < empty_sites
+        # Partially empty sites never report some of their KPIs
+        partial = ~self.empty & (rng.random(sites) < partial_sites)
+        self.missing_kpis = partial[:, None] & (rng.random((sites, len(KPI_COLUMNS))) < 0.5)
+        self.missing_kpis[self.empty] = True
+
+def iter_chunks(
+    sites: int,
+    days: int,
+    start: str = "2024-01-01",
+    missing_rate: float = 0.05,
+    empty_sites: float = 0.02,
+    partial_sites: float = 0.1,
+    seed: int = 0,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+):
+    """Yield the raw rows for `sites` sites over `days` days from `start`, a block of days at a time.
+
+    `missing_rate` blanks individual values at random; `empty_sites` and
+    `partial_sites` are the fractions of sites with all / some KPIs always empty.
+    """
+    profile = _SiteProfile(sites, seed, empty_sites, partial_sites)
+    start = pd.Timestamp(start)
+    days_per_chunk = max(1, chunk_rows // sites)
+
+    for first in range(0, days, days_per_chunk):
+        n_days = min(days_per_chunk, days - first)
+        dates = start + pd.to_timedelta(np.arange(first, first + n_days), unit="D")
+        values = np.tile(profile.scale, (n_days, 1))
+        for i, day in enumerate(d.toordinal() for d in dates):
+            # Seeded by the date, so the output doesn't depend on chunking or appends
+            rng = np.random.default_rng([seed, day])
+            rows = values[i * sites:(i + 1) * sites]
+            rows *= rng.gamma(20.0, 1 / 20.0, size=rows.shape).astype("float32")
+            if missing_rate > 0:
+                rows[rng.random(rows.shape) < missing_rate] = np.nan
+        values[np.tile(profile.missing_kpis, (n_days, 1))] = np.nan
+
+        chunk = pd.DataFrame(values.round(5), columns=KPI_COLUMNS)
+        chunk.insert(0, "date", np.repeat(dates.strftime(DATE_FORMAT).to_numpy(), sites))
+        chunk.insert(1, "sitecode", np.tile(profile.codes, n_days))
+        yield chunk
+
+def _write_csv(chunks, path: Path, append: bool) -> int:
+    rows = 0
+    header = not (append and path.exists() and path.stat().st_size > 0)
+    with open(path, "ab" if append else "wb") as f:
+        if header:
+            f.write((",".join(["date", "sitecode"] + KPI_COLUMNS) + "\n").encode())
+        for chunk in chunks:
+            try:
+                import pyarrow as pa
+                import pyarrow.csv as pcsv
+                # Several times faster than DataFrame.to_csv; NaN is written as an empty field
+                options = pcsv.WriteOptions(include_header=False, quoting_style="none")
+                pcsv.write_csv(pa.Table.from_pandas(chunk, preserve_index=False), f, options)
+            except ImportError:
+                f.write(chunk.to_csv(header=False, index=False).encode())
+            rows += len(chunk)
+    return rows
+
+def _write_parquet(chunks, path: Path) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def _write_xlsx(chunks, path: Path) -> int:
+    import xlsxwriter
+
+    # constant_memory streams each row to disk once it is written
+    workbook = xlsxwriter.Workbook(str(path), {"constant_memory": True, "nan_inf_to_errors": False})
+    sheet = workbook.add_worksheet("Data")
+    sheet.write_row(0, 0, ["date", "sitecode"] + KPI_COLUMNS)
+    rows = 0
+    try:
+        for chunk in chunks:
+            if rows + len(chunk) > XLSX_MAX_ROWS:
+                raise ValueError(f"Too many rows for an .xlsx sheet (max {XLSX_MAX_ROWS}); use .csv or .parquet")
+            for record in chunk.itertuples(index=False):
+                rows += 1
+                # Missing KPIs are left as empty cells
+                sheet.write_row(rows, 0, [None if v != v else v for v in record])
+    finally:
+        workbook.close()
+    return rows
+
+def generate_dataset(path, sites: int, days: int, append: bool = False, **options) -> int:
+    """Write a synthetic raw dataset to `path` (.csv, .parquet or .xlsx); returns the row count.
+
+    With `append=True` (CSV only) rows are added to an existing file, e.g.
+    later days from a later `start` for incremental cleaning runs. Other
+    keyword arguments are passed to iter_chunks().
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".xlsb":
+        raise ValueError("Writing .xlsb is not supported (no writer library); use .xlsx, .csv or .parquet")
+    if suffix not in FORMATS:
+        raise ValueError(f"Unsupported output format {suffix!r}; expected one of {', '.join(FORMATS)}")
+    if append and suffix != ".csv":
+        raise ValueError("Only CSV datasets can be appended to")
+
+    chunks = iter_chunks(sites, days, **options)
+    if suffix == ".csv":
+        return _write_csv(chunks, path, append)
+    if suffix == ".parquet":
+        return _write_parquet(chunks, path)
+    return _write_xlsx(chunks, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw KPI dataset.")
+    parser.add_argument("path", type=Path, help="output file (.csv, .parquet or .xlsx)")
+    parser.add_argument("--sites", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--start", default="2024-01-01", help="first date (YYYY-MM-DD)")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="fraction of values left empty at random")
+    parser.add_argument("--empty-sites", type=float, default=0.02, help="fraction of sites with no KPI values")
+    parser.add_argument("--partial-sites", type=float, default=0.1, help="fraction of sites missing some KPIs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--append", action="store_true", help="add rows to an existing CSV")
+    args = parser.parse_args()
+
+    rows = generate_dataset(
+        args.path, args.sites, args.days, append=args.append, start=args.start,
+        missing_rate=args.missing_rate, empty_sites=args.empty_sites,
+        partial_sites=args.partial_sites, seed=args.seed, chunk_rows=args.chunk_rows,
+    )
+    print(f"Wrote {rows} rows to {args.path}")
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from project_pipeline import data_store
+from project_pipeline.settings_model import Settings
+
+# Define file paths
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = BASE_DIR / "artifacts"
+
+# Number of past builds kept (least recently used are evicted); pinned builds come on top
+MAX_ENTRIES = int(os.getenv("ARTIFACT_CACHE_SIZE", "8"))
+
+# Holds the time until which a build is pinned (see pinned())
+PIN_FILE = ".pinned"
+
+# Settings that only affect scheduling/delivery, not the report content
+NON_CONTENT_FIELDS = {"frequency", "time", "times", "days", "cron", "mailing_list", "email_payload"}
+
+def dataset_fingerprint() -> dict:
+    """Identify the current cleaned dataset by file mtime/size and last date."""
+    last_date = data_store.date_range()[1]
+    csv = data_store.DATASET_PATH.stat()
+    return {
+        "mtime_ns": csv.st_mtime_ns,
+        "size": csv.st_size,
+        "last_date": str(last_date) if last_date is not None else None,
+    }
+
+def build_key(settings: Settings, variant: str = "") -> str:
+    """Hash of the normalized report settings + dataset fingerprint (+ renderer variant)."""
+    payload = {
+        "settings": settings.model_dump(mode="json", exclude=NON_CONTENT_FIELDS),
+        "dataset": dataset_fingerprint(),
+        "variant": variant,
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+_pin = threading.local()
+
+@contextmanager
+def pinned(seconds: float):
+    """Keep the builds this thread stores or looks up in the block from eviction for `seconds`.
+
+    Used for reports pre-generated for a scheduled send: they must still be
+    cached when the send runs, however many other builds happen meanwhile.
+    """
+    _pin.until = time.time() + seconds
+    try:
+        yield
+    finally:
+        _pin.until = None
+
+def _pinned_until(entry: Path) -> float:
+    try:
+        return float((entry / PIN_FILE).read_text())
+    except (OSError, ValueError):
+        return 0.0
+
+def _touch(entry: Path) -> None:
+    """Mark a build as recently used (and pinned, inside pinned())."""
+    until = getattr(_pin, "until", None)
+    if until is not None and until > _pinned_until(entry):
+        tmp = entry / _tmp_name(PIN_FILE)
+        tmp.write_text(str(until))
+        os.replace(tmp, entry / PIN_FILE)
+    os.utime(entry)
+
+def lookup(key: str, name: str) -> Path | None:
+    """Cached artifact `name` for build `key`, marking the build as recently used."""
+    path = CACHE_DIR / key / name
+    if not path.exists():
+        return None
+    _touch(path.parent)
+    return path
+
+def _tmp_name(name: str) -> str:
+    """Temporary file name private to this thread (concurrent requests write the same targets)."""
+    return f".{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def store(key: str, name: str, source: Path) -> Path:
+    """Copy a freshly built artifact into the cache."""
+    entry = CACHE_DIR / key
+    entry.mkdir(parents=True, exist_ok=True)
+    target = entry / name
+    tmp = entry / _tmp_name(name)
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+    _touch(entry)
+    _evict()
+    return target
+
+def publish(cached: Path, target: Path) -> Path:
+    """Copy a cached artifact to its usual location (e.g. report.pptx)."""
+    target = Path(target)
+    tmp = target.with_name(_tmp_name(target.name))
+    shutil.copyfile(cached, tmp)
+    os.replace(tmp, target)
+    return target
+
+def _evict() -> None:
+    """Keep only the MAX_ENTRIES most recently used builds, plus any that are pinned."""
+    now = time.time()
+    entries = sorted(
+        (p for p in CACHE_DIR.iterdir() if p.is_dir() and _pinned_until(p) <= now),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in entries[MAX_ENTRIES:]:
+        shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from project_pipeline import artifact_cache, data_store
+from project_pipeline.email_outbox import email_outbox
+from project_pipeline.excel_export import CHART_RENDERER
+from project_pipeline.ppt_export import PPT_CHART_MODE
+from project_pipeline.report_pipeline import ReportPipeline, profile_sinks
+from project_pipeline.settings_model import Settings
+
+# Worker processes for batch runs (defaults to one per core)
+BATCH_WORKERS = int(os.getenv("REPORT_BATCH_WORKERS", "0")) or os.cpu_count() or 1
+
+def _init_worker() -> None:
+    """Load the cleaned dataset once per worker; every profile it builds reuses it."""
+    data_store.get_dataset([])
+
+def _build_group(group: list, mode: str | None) -> dict:
+    """Build the reports for profiles with identical content.
+
+    The first profile is rendered; the others get copies of its files.
+    Returns {profile name: {artifact: path}} with paths as strings.
+    """
+    (first, first_settings), others = group[0], group[1:]
+    built = ReportPipeline(profile_sinks(first, mode), max_workers=2).run(Settings(**first_settings), use_cache=False)
+    results = {first: built}
+
+    for name, _ in others:
+        results[name] = {
+            sink.name: artifact_cache.publish(built[sink.name], sink.path)
+            for sink in profile_sinks(name, mode) if sink.name in built
+        }
+    return {name: {kind: str(path) for kind, path in paths.items()} for name, paths in results.items()}
+
+def generate_profiles(names: list | None = None, mode: str | None = None, send: bool = False, max_workers: int | None = None) -> dict:
+    """Build every profile (or just `names`) on a process pool.
+
+    Profiles whose report content is identical (same charts, window and
+    data, whatever their mailing list) are built once. Returns
+    {profile name: {artifact: path}} for successful profiles and
+    {profile name: {"error": message}} for failed ones. With `send`, each
+    built profile with recipients is queued on the email outbox (its
+    "email_job" is the outbox job id).
+    """
+    mode = mode or PPT_CHART_MODE
+    profiles = data_store.get_profiles()
+    if names is not None:
+        unknown = sorted(set(names) - set(profiles))
+        if unknown:
+            raise KeyError(f"Unknown profile(s): {', '.join(unknown)}")
+        profiles = {name: profiles[name] for name in names}
+    if not profiles:
+        return {}
+
+    # Group by content key so identical decks are rendered once
+    groups = {}
+    for name, s in profiles.items():
+        key = artifact_cache.build_key(s, variant=f"{CHART_RENDERER}:{mode}")
+        groups.setdefault(key, []).append((name, s.model_dump(mode="json")))
+
+    # forkserver/spawn: the API process runs other threads, which fork() doesn't mix with
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+    results = {}
+    workers = min(max_workers or BATCH_WORKERS, len(groups))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        futures = {pool.submit(_build_group, group, mode): group for group in groups.values()}
+        for future in as_completed(futures):
+            try:
+                results.update(future.result())
+            except Exception as e:
+                traceback.print_exc()
+                results.update({name: {"error": str(e)} for name, _ in futures[future]})
+
+    print(f"Built {len(profiles)} profile report(s) from {len(groups)} distinct build(s)")
+
+    if send:
+        # Delivered (with retries) by the outbox worker, not in this request or batch
+        for name, paths in results.items():
+            if "pptx" in paths and profiles[name].mailing_list.strip():
+                paths["email_job"] = email_outbox.enqueue(profiles[name], ppt_path=paths["pptx"])["id"]
+    return results
+
+if __name__ == "__main__":
+    # Nightly batch: python -m project_pipeline.batch_reports
+    generate_profiles(send=True)
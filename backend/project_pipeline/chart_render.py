@@ -0,0 +1,94 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.dates as mdates
+
+# Hardcoded colors for KPIs and equations
+COLOR_MAP = {
+    "kpi001": "#1f77b4",   # blue
+    "kpi002": "#ff7f0e",   # orange
+    "kpi003": "#23e923",   # green
+    "kpi004": "#d62728",   # red
+    "kpi005": "#9467bd",   # purple
+    "kpi006": "#8c564b",   # brown
+    "kpi007": "#9DC9CC",   # pink
+    "kpi008": "#962491",   # gray
+    "kpi009": "#bcbd22",   # olive
+    "line_equation": "#CC9D9D",  # light red for line equation
+    "bar_equation": "#403F40",   # dark gray for bar equation
+}
+
+# Fallback colors for series not in COLOR_MAP
+DEFAULT_BAR_COLOR = "#ff0000"
+DEFAULT_LINE_COLOR = "#0000ff"
+
+def _scaled_range(data: pd.DataFrame, low: float, high: float) -> tuple:
+    """(min * low, max * high) as ints, or (0, 1) when there is nothing to plot."""
+    if data.empty:
+        return 0, 1
+    lo, hi = data.min().min(), data.max().max()
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return 0, 1
+    return int(lo * low), int(hi * high)
+
+def axis_ranges(line_data: pd.DataFrame, bar_data: pd.DataFrame) -> tuple:
+    """Auto-scaled ((bar_min, bar_max), (line_min, line_max)) shared by every chart output."""
+    return _scaled_range(bar_data, 0.95, 1.05), _scaled_range(line_data, 0.9, 1.05)
+
+def render_chart(dates: pd.Series, line_data: pd.DataFrame, bar_data: pd.DataFrame) -> Figure:
+    """Draw the combined bar (left axis) + line (right axis) KPI chart."""
+    fig = Figure(figsize=(8, 5), dpi=150)
+    FigureCanvasAgg(fig)
+    ax_bar = fig.add_subplot()
+    ax_line = ax_bar.twinx()
+    (bar_min, bar_max), (line_min, line_max) = axis_ranges(line_data, bar_data)
+    x = mdates.date2num(pd.to_datetime(dates))
+
+    # Clustered columns, one slot per bar series within each day
+    if not bar_data.empty:
+        width = 0.8 / len(bar_data.columns)
+        offsets = (np.arange(len(bar_data.columns)) - (len(bar_data.columns) - 1) / 2) * width
+        for offset, col in zip(offsets, bar_data.columns):
+            color = COLOR_MAP.get(col, DEFAULT_BAR_COLOR)
+            ax_bar.bar(x + offset, bar_data[col].to_numpy(), width=width, color=color, edgecolor=color, label=col)
+
+    # Lines with circle markers on the secondary axis
+    for col in line_data.columns:
+        color = COLOR_MAP.get(col, DEFAULT_LINE_COLOR)
+        ax_line.plot(x, line_data[col].to_numpy(), color=color, marker="o", markersize=4, label=col)
+
+    ax_bar.set_title("KPI Chart")
+    ax_bar.set_xlabel("Date")
+    ax_bar.set_ylabel("Bar Values")
+    ax_line.set_ylabel("Line Values")
+    ax_bar.set_ylim(bar_min, max(bar_max, bar_min + 1))
+    ax_line.set_ylim(line_min, max(line_max, line_min + 1))
+    ax_bar.grid(False)
+    ax_line.grid(True, axis="y")
+    ax_bar.xaxis.set_major_formatter(mdates.DateFormatter("%d-%b"))
+    fig.autofmt_xdate()
+
+    # Single legend on the right for both axes
+    handles, labels = [], []
+    for ax in (ax_bar, ax_line):
+        h, l = ax.get_legend_handles_labels()
+        handles += h
+        labels += l
+    if handles:
+        fig.legend(handles, labels, loc="center right")
+        fig.subplots_adjust(right=0.7)
+    return fig
+
+def render_chart_png(dates: pd.Series, line_data: pd.DataFrame, bar_data: pd.DataFrame, path: Path) -> Path:
+    """Render the KPI chart straight to a PNG file (headless, no Excel needed)."""
+    fig = render_chart(dates, line_data, bar_data)
+    fig.savefig(path, format="png")
+    return Path(path)
+
+def render_chart_pdf(dates: pd.Series, line_data: pd.DataFrame, bar_data: pd.DataFrame, path: Path) -> Path:
+    """Render the KPI chart as a one-page vector PDF (small enough to email)."""
+    fig = render_chart(dates, line_data, bar_data)
+    fig.savefig(path, format="pdf")
+    return Path(path)
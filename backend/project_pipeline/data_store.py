@@ -0,0 +1,207 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from project_pipeline import rollups
+from project_pipeline.settings_model import Settings, load_settings
+
+# Define file paths
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATASET_PATH = BASE_DIR / "cleaned_dataset.csv"
+COLUMNAR_PATH = BASE_DIR / "cleaned_dataset.parquet"
+SETTINGS_PATH = BASE_DIR / "settings.json"
+PROFILES_PATH = BASE_DIR / "profiles.json"
+ROLLUP_PATHS = {g: BASE_DIR / f"cleaned_dataset.{g}.parquet" for g in rollups.ROLLUP_PERIODS}
+
+# Datasets bigger than this are not kept in memory (only the needed columns are loaded per call)
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# One cached entry per file: (file key, value)
+_cache = {}
+_lock = threading.Lock()
+
+def _file_key(path: Path):
+    """Identify a file version by mtime + size (None if missing)."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _write_text(path: Path, text: str) -> None:
+    """Write via a temp file + os.replace, so other workers never read a half-written file."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+def invalidate() -> None:
+    """Drop everything held in memory."""
+    with _lock:
+        _cache.clear()
+
+# --- Settings ---
+
+def get_settings() -> Settings:
+    """Parsed settings.json (create with defaults if missing). Callers get their own copy."""
+    with _lock:
+        key = _file_key(SETTINGS_PATH)
+        if key is None:
+            _write_text(SETTINGS_PATH, Settings().model_dump_json(indent=2))
+            key = _file_key(SETTINGS_PATH)
+        entry = _cache.get("settings")
+        if entry is not None and entry[0] == key:
+            s = entry[1]
+        else:
+            s = load_settings(json.loads(SETTINGS_PATH.read_text(encoding="utf-8")))
+            _cache["settings"] = (key, s)
+        return s.model_copy(deep=True)
+
+def write_settings(s: Settings) -> None:
+    """Write settings.json and keep the in-memory copy in sync."""
+    with _lock:
+        _write_text(SETTINGS_PATH, s.model_dump_json(indent=2))
+        _cache["settings"] = (_file_key(SETTINGS_PATH), s.model_copy(deep=True))
+
+# --- Report profiles ---
+
+# Profile names are also used as directory names under reports/
+PROFILE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def check_profile_name(name: str) -> str:
+    if not PROFILE_NAME.match(name):
+        raise ValueError(f"Invalid profile name: {name!r} (use letters, digits, '-' and '_')")
+    return name
+
+def _load_profiles() -> dict:
+    """The cached profiles (call with _lock held; callers must not modify them)."""
+    key = _file_key(PROFILES_PATH)
+    entry = _cache.get("profiles")
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    raw = json.loads(PROFILES_PATH.read_text(encoding="utf-8")) if key is not None else {}
+    profiles = {check_profile_name(name): load_settings(s) for name, s in raw.items()}
+    _cache["profiles"] = (key, profiles)
+    return profiles
+
+def get_profiles() -> dict:
+    """Named report profiles from profiles.json ({} if there are none). Callers get their own copy."""
+    with _lock:
+        return {name: s.model_copy(deep=True) for name, s in _load_profiles().items()}
+
+def _write_profiles(profiles: dict) -> None:
+    _write_text(PROFILES_PATH, json.dumps(
+        {name: s.model_dump(mode="json") for name, s in sorted(profiles.items())}, indent=2,
+    ))
+    _cache["profiles"] = (_file_key(PROFILES_PATH), profiles)
+
+def write_profile(name: str, s: Settings) -> None:
+    """Create or replace one profile."""
+    check_profile_name(name)
+    # Read-modify-write under the lock, so concurrent changes are not lost
+    with _lock:
+        profiles = {**_load_profiles(), name: s.model_copy(deep=True)}
+        _write_profiles(profiles)
+
+def delete_profile(name: str) -> bool:
+    """Remove a profile; False if it didn't exist."""
+    with _lock:
+        profiles = dict(_load_profiles())
+        if profiles.pop(name, None) is None:
+            return False
+        _write_profiles(profiles)
+    return True
+
+# --- Dataset ---
+
+def _read_dataset(columns: list | None) -> pd.DataFrame:
+    """Load the cleaned dataset (date + `columns`, or everything), preferring the Parquet copy."""
+    wanted = None if columns is None else ["date"] + list(columns)
+
+    # Parquet is only trusted if it is at least as new as the CSV
+    if COLUMNAR_PATH.exists() and COLUMNAR_PATH.stat().st_mtime >= DATASET_PATH.stat().st_mtime:
+        try:
+            import pyarrow.parquet as pq
+            available = pq.read_schema(COLUMNAR_PATH).names
+            cols = None if wanted is None else [c for c in wanted if c in available]
+            return _sorted_by_date(pd.read_parquet(COLUMNAR_PATH, columns=cols))
+        except Exception as e:
+            print(f"Parquet load failed, falling back to CSV: {e}")
+
+    usecols = None if wanted is None else (lambda c: c in wanted)
+    return _sorted_by_date(pd.read_csv(DATASET_PATH, usecols=usecols, parse_dates=["date"]))
+
+def _sorted_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    """Sort once at load time so date windows can be found by binary search."""
+    if not df["date"].is_monotonic_increasing:
+        df = df.sort_values("date", kind="stable", ignore_index=True)
+    return df
+
+def date_slice(dates: pd.Series, start=None, end=None) -> slice:
+    """Row positions with start <= date <= end in a date-sorted column (O(log n))."""
+    values = dates.to_numpy()
+    lo = 0 if start is None else values.searchsorted(np.datetime64(pd.Timestamp(start)), "left")
+    hi = len(values) if end is None else values.searchsorted(np.datetime64(pd.Timestamp(end)), "right")
+    return slice(lo, hi)
+
+def _cached_dataset() -> pd.DataFrame | None:
+    """The full in-memory frame (None if it is too big to keep)."""
+    with _lock:
+        key = (_file_key(DATASET_PATH), _file_key(COLUMNAR_PATH))
+        entry = _cache.get("dataset")
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        df = _read_dataset(None)
+        # Too big to keep: remember that (value None) and load per call instead
+        fits = df.memory_usage(deep=True).sum() <= DATASET_CACHE_MAX_BYTES
+        _cache["dataset"] = (key, df if fits else None)
+        return df if fits else None
+
+def get_dataset(columns: list | None = None, start=None, end=None) -> pd.DataFrame:
+    """Cleaned dataset restricted to date + `columns` (all columns if None) and start..end.
+
+    The full frame is held in memory, sorted by date, and reloaded when the
+    CSV/Parquet files change. Callers get their own copy and may add columns to it.
+    """
+    df = _cached_dataset()
+    if df is None:
+        df = _read_dataset(columns)
+        return df.iloc[date_slice(df["date"], start, end)]
+
+    rows = date_slice(df["date"], start, end)
+    if columns is None:
+        return df.iloc[rows].copy()
+    return df.iloc[rows][["date"] + [c for c in columns if c in df.columns]].copy()
+
+def date_range() -> tuple:
+    """(first, last) date in the cleaned dataset, or (None, None) if it is empty."""
+    df = _cached_dataset()
+    dates = df["date"] if df is not None else _read_dataset([])["date"]
+    if dates.empty:
+        return None, None
+    return dates.iloc[0], dates.iloc[-1]
+
+def get_rollup(granularity: str, columns: list | None = None, how: str = "mean") -> pd.DataFrame:
+    """Weekly/monthly KPI values (mean or sum of the daily values in each period).
+
+    Uses the rollups materialized by the cleaner, computing them from the
+    daily dataset only if they are missing or older than it.
+    """
+    path = ROLLUP_PATHS[granularity]
+    with _lock:
+        key = (_file_key(path), _file_key(DATASET_PATH))
+        entry = _cache.get(f"rollup:{granularity}")
+        rolled = entry[1] if entry is not None and entry[0] == key else None
+
+    if rolled is None:
+        if key[0] is not None and key[1] is not None and key[0][0] >= key[1][0]:
+            rolled = pd.read_parquet(path)
+        else:
+            rolled = rollups.rollup(get_dataset(None), granularity)
+        with _lock:
+            _cache[f"rollup:{granularity}"] = (key, rolled)
+
+    return rollups.finalize(rolled, how, columns)
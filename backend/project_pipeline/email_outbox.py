@@ -0,0 +1,219 @@
+import asyncio
+import os
+import random
+import sqlite3
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from project_pipeline import data_store
+from project_pipeline.email_service import EmailDeliveryError, send_email_report
+from project_pipeline.settings_model import Settings
+
+# Define file paths
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTBOX_PATH = Path(os.getenv("EMAIL_OUTBOX_PATH", BASE_DIR / "outbox.db"))
+
+# Retry policy: delay doubles after each failed attempt (with jitter), up to the cap
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+OUTBOX_BASE_DELAY = float(os.getenv("EMAIL_RETRY_DELAY", "30"))
+OUTBOX_MAX_DELAY = float(os.getenv("EMAIL_RETRY_MAX_DELAY", "3600"))
+# Seconds a worker may spend on one send before another worker may take the job over
+OUTBOX_SEND_TIMEOUT = float(os.getenv("EMAIL_SEND_TIMEOUT", "600"))
+
+# queued -> sending -> sent, or back to retrying on failure, or dead after the last attempt
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL,
+    settings TEXT NOT NULL,          -- JSON snapshot of the report settings
+    ppt_path TEXT,                   -- prebuilt deck, or NULL to build it at send time
+    recipients TEXT NOT NULL,        -- recipients still to be sent to ("a@x;b@y")
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS email_jobs_due ON email_jobs (status, next_attempt_at);
+"""
+
+class EmailOutbox:
+    """Durable queue of report emails, drained by an asyncio worker.
+
+    Jobs are rows in a local SQLite database, so queued and retrying sends
+    survive restarts. Recipients that were delivered are removed from the
+    job, so a retry only goes to the ones that failed.
+    """
+
+    def __init__(self, path: Path = OUTBOX_PATH):
+        self.path = Path(path)
+        self._task = None
+        self._loop = None
+        self._wake = None
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Connection for one transaction (committed on success, always closed)."""
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _now(self) -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    @staticmethod
+    def _public(row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(row)
+        del job["settings"]
+        return job
+
+    def enqueue(self, settings: Settings | None = None, ppt_path: Path | None = None) -> dict:
+        """Queue a report email (settings are snapshotted now) and return the job."""
+        settings = settings or data_store.get_settings()
+        recipients = [r.strip() for r in settings.mailing_list.split(";") if r.strip()]
+        if not recipients:
+            raise ValueError("No recipients in settings.json mailing_list")
+
+        with self._connect() as db:
+            cur = db.execute(
+                "INSERT INTO email_jobs (status, settings, ppt_path, recipients, next_attempt_at, created_at, updated_at)"
+                " VALUES ('queued', ?, ?, ?, ?, ?, ?)",
+                (settings.model_dump_json(), str(ppt_path) if ppt_path else None, ";".join(recipients),
+                 time.time(), self._now(), self._now()),
+            )
+            job_id = cur.lastrowid
+        self._notify()
+        return self.job(job_id)
+
+    def job(self, job_id: int) -> dict | None:
+        with self._connect() as db:
+            return self._public(db.execute("SELECT * FROM email_jobs WHERE id=?", (job_id,)).fetchone())
+
+    def status(self, limit: int = 20) -> dict:
+        """Job counts per status plus the most recent jobs."""
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM email_jobs GROUP BY status").fetchall())
+            recent = db.execute("SELECT * FROM email_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return {"counts": counts, "recent": [self._public(r) for r in recent]}
+
+    # --- Worker ---
+
+    def _notify(self) -> None:
+        """Wake the worker (safe to call from any thread)."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _claim(self):
+        """Mark the next due job as sending; returns it, or the seconds until one is due.
+
+        Several API workers may drain the same outbox: the conditional UPDATE
+        makes sure only one of them claims a job. A claimed job that isn't
+        finished within OUTBOX_SEND_TIMEOUT (its worker died) becomes due again.
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT * FROM email_jobs WHERE status IN ('queued', 'retrying', 'sending')"
+                " ORDER BY next_attempt_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None, None
+            wait = row["next_attempt_at"] - time.time()
+            if wait > 0:
+                return None, wait
+            deadline = time.time() + OUTBOX_SEND_TIMEOUT
+            claimed = db.execute(
+                "UPDATE email_jobs SET status='sending', next_attempt_at=?, updated_at=?"
+                " WHERE id=? AND status=? AND next_attempt_at=?",
+                (deadline, self._now(), row["id"], row["status"], row["next_attempt_at"]),
+            ).rowcount
+            # The deadline identifies this claim when the result is written back
+            return ({**dict(row), "claimed_until": deadline}, None) if claimed else (None, 0)
+
+    def _deliver(self, row) -> None:
+        settings = Settings.model_validate_json(row["settings"])
+        settings.mailing_list = row["recipients"]
+        ppt_path = row["ppt_path"]
+        if ppt_path and not Path(ppt_path).exists():
+            print(f"Email job {row['id']}: {ppt_path} is gone, rebuilding the deck")
+            ppt_path = None
+        send_email_report(ppt_path, settings=settings)
+
+    def _finish(self, row: dict, error: Exception | None) -> None:
+        """Record the outcome, unless the claim expired and another worker has taken the job over."""
+        attempts = row["attempts"] + 1
+        if error is None:
+            status, recipients, next_at, message = "sent", row["recipients"], row["next_attempt_at"], None
+        else:
+            # Only the recipients that failed are retried
+            failed = getattr(error, "failed", None)
+            recipients = ";".join(failed) if failed else row["recipients"]
+            # Invalid settings or recipients won't get better; anything else (SMTP, an
+            # artifact evicted from the cache mid-read, ...) is retried
+            permanent = isinstance(error, ValueError)
+            status = "dead" if permanent or attempts >= OUTBOX_MAX_ATTEMPTS else "retrying"
+            delay = min(OUTBOX_BASE_DELAY * 2 ** (attempts - 1), OUTBOX_MAX_DELAY)
+            next_at = time.time() + delay * random.uniform(0.8, 1.2)
+            message = str(error)
+
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE email_jobs SET status=?, recipients=?, attempts=?, next_attempt_at=?, last_error=?, updated_at=?"
+                " WHERE id=? AND status='sending' AND next_attempt_at=?",
+                (status, recipients, attempts, next_at, message, self._now(), row["id"], row["claimed_until"]),
+            ).rowcount
+        if not updated:
+            print(f"Email job {row['id']} was reclaimed after OUTBOX_SEND_TIMEOUT; result ({status}) not recorded")
+
+    async def run(self) -> None:
+        """Send due jobs one at a time until cancelled."""
+        while True:
+            self._wake.clear()
+            # SQLite calls can wait on other workers' locks: keep them off the event loop
+            row, wait = await asyncio.to_thread(self._claim)
+            if row is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=60 if wait is None else min(wait, 60))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await asyncio.to_thread(self._deliver, row)
+                error = None
+            except EmailDeliveryError as e:
+                error = e
+            except Exception as e:
+                traceback.print_exc()
+                error = e
+            await asyncio.to_thread(self._finish, row, error)
+
+    async def start(self) -> None:
+        """Start the worker on the running loop (jobs cut off by a restart are picked up once stale)."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+# Shared outbox used by the API and the scheduler
+email_outbox = EmailOutbox()
@@ -1,18 +1,26 @@
-import json
+import hashlib
+import io
 import smtplib
 import ssl
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from email.message import EmailMessage
+from email.message import EmailMessage, MIMEPart
+from email.utils import make_msgid
 import os
 from dotenv import load_dotenv
 
+from project_pipeline import data_store
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Define project paths
 BASE_DIR = Path(__file__).resolve().parent.parent
-SETTINGS_PATH = BASE_DIR / "settings.json"   
-PPT_PATH = BASE_DIR / "report.pptx"       
+PPT_PATH = BASE_DIR / "report.pptx"
 
 # Email server configuration (from .env )
 SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
@@ -20,42 +28,264 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
 SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER)
+# "ssl" (implicit TLS, port 465), "starttls" (port 587) or "none" (local test servers)
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl")
 
-def send_email_report():
-    # Load recipients from settings.json
-    with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
-        settings = json.load(f)
+# Connection pool: open connections, and idle seconds after which a NOOP checks one is still alive
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_KEEPALIVE = float(os.getenv("SMTP_KEEPALIVE", "30"))
 
-    recipients = settings.get("mailing_list", "").split(";")
-    recipients = [r.strip() for r in recipients if r.strip()]  # Clean up emails
+# Chart images in "png"/"inline" emails are downscaled to this width (px)
+EMAIL_IMAGE_WIDTH = int(os.getenv("EMAIL_IMAGE_WIDTH", "1000"))
 
-    if not recipients:
-        raise ValueError("No recipients in settings.json mailing_list")
+PPTX_SUBTYPE = "vnd.openxmlformats-officedocument.presentationml.presentation"
+MIME_TYPES = {".pptx": ("application", PPTX_SUBTYPE), ".pdf": ("application", "pdf"), ".png": ("image", "png")}
+
+# Body text for each Settings.email_payload
+PAYLOAD_TEXT = {
+    "pptx": "Attached is the latest KPI report in PowerPoint format.",
+    "pdf": "Attached is the latest KPI report in PDF format.",
+    "png": "Attached is the latest KPI chart.",
+    "inline": "The latest KPI report is included below (view this email as HTML).",
+}
+
+class EmailDeliveryError(RuntimeError):
+    """Some recipients could not be sent to; `failed` maps recipient -> error."""
+
+    def __init__(self, failed: dict):
+        super().__init__(f"Email delivery failed for {', '.join(failed)}")
+        self.failed = failed
+
+class SMTPPool:
+    """Reuses logged-in SMTP connections across messages (at most `size` open).
+
+    A connection idle for longer than `keepalive` seconds is checked with
+    NOOP before use; a send that fails because the server dropped the
+    connection is retried once on a fresh one.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=SMTP_USER, password=SMTP_PASS,
+                 security=SMTP_SECURITY, size=SMTP_POOL_SIZE, keepalive=SMTP_KEEPALIVE, timeout=30):
+        if security not in ("ssl", "starttls", "none"):
+            raise ValueError(f"Unsupported SMTP_SECURITY: {security}")
+        self.host, self.port, self.user, self.password = host, port, user, password
+        self.security, self.size, self.keepalive, self.timeout = security, size, keepalive, timeout
+        self._idle = []                          # (connection, last used) ready for reuse
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                server.starttls(context=ssl.create_default_context())
+        if self.user:
+            server.login(self.user, self.password)
+        return server
+
+    def _alive(self, server: smtplib.SMTP, last_used: float) -> bool:
+        if time.monotonic() - last_used < self.keepalive:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a live connection (blocks while all `size` are in use)."""
+        with self._slots:
+            server = None
+            while server is None:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    server = self._connect()
+                elif self._alive(*entry):
+                    server = entry[0]
+                else:
+                    self._close(entry[0])
+            try:
+                yield server
+            except smtplib.SMTPResponseException:
+                # The server answered (e.g. refused a recipient): the session is still usable
+                self._release(server)
+                raise
+            except BaseException:
+                server.close()
+                raise
+            self._release(server)
+
+    def _release(self, server: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    def send(self, msg: EmailMessage) -> None:
+        """Send one message, reconnecting once if the server dropped the connection."""
+        for attempt in (1, 2):
+            try:
+                with self.connection() as server:
+                    server.send_message(msg)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                if attempt == 2:
+                    raise
+
+    def send_many(self, messages: list, max_workers: int | None = None) -> dict:
+        """Send messages concurrently (bounded by the pool size); returns {To: error} for failures."""
+        def send_one(msg):
+            try:
+                self.send(msg)
+                return msg["To"], None
+            except Exception as e:
+                return msg["To"], str(e)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers or self.size, self.size)) as workers:
+            return {to: error for to, error in workers.map(send_one, messages) if error}
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+# Shared pool for the API process and the scheduler
+smtp_pool = SMTPPool()
 
-    # Check if report file exists
-    if not PPT_PATH.exists():
-        raise FileNotFoundError(f"PowerPoint not found at {PPT_PATH}")
+# --- Message parts ---
+# Encoded parts are cached by content hash and shared by every message that
+# carries them, so a deck sent to many recipients is base64-encoded once.
 
-    # Build email message
+PART_CACHE_SIZE = 32
+_parts = OrderedDict()
+_parts_lock = threading.Lock()
+
+def _cached_part(key: tuple, build) -> MIMEPart:
+    with _parts_lock:
+        if key in _parts:
+            _parts.move_to_end(key)
+            return _parts[key]
+    part = build()
+    part.as_bytes()   # fixes encodings and boundaries now, so threads can share the part
+    with _parts_lock:
+        _parts[key] = part
+        while len(_parts) > PART_CACHE_SIZE:
+            _parts.popitem(last=False)
+    return part
+
+def _text_part(payload: str) -> MIMEPart:
+    def build():
+        part = MIMEPart()
+        part.set_content(PAYLOAD_TEXT[payload])
+        return part
+    return _cached_part(("text", payload), build)
+
+def reduce_png(data: bytes, width: int = EMAIL_IMAGE_WIDTH) -> bytes:
+    """Downscale a chart image and store it as an optimized 256-colour PNG."""
+    from PIL import Image
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    if img.width > width:
+        img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+    out = io.BytesIO()
+    img.quantize(colors=256).save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+def attachment_part(path: Path, reduce: bool = False) -> MIMEPart:
+    """Base64-encoded attachment for `path` (a downscaled copy for PNGs if `reduce`)."""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Report file not found at {path}")
+    # Read once: the cache key is the hash of exactly the bytes that get attached
+    data = path.read_bytes()
+
+    def build():
+        maintype, subtype = MIME_TYPES[path.suffix]
+        part = MIMEPart()
+        part.set_content(reduce_png(data) if reduce else data, maintype=maintype, subtype=subtype, disposition="attachment", filename=path.name)
+        return part
+    return _cached_part(("file", hashlib.sha256(data).hexdigest(), path.name, reduce), build)
+
+def inline_part(png_path: Path, data) -> MIMEPart:
+    """HTML body with the (downscaled) chart inline and the plotted values as tables."""
+    tables = "".join(
+        f"<h3>{title}</h3>" + frame.set_axis(data.dates.dt.strftime("%Y-%m-%d")).to_html(float_format="{:,.2f}".format, na_rep="")
+        for title, frame in (("Line series", data.line_data), ("Bar series", data.bar_data)) if not frame.empty
+    )
+    png = Path(png_path).read_bytes()
+    summary = hashlib.sha256(tables.encode()).hexdigest()
+
+    def build():
+        cid = make_msgid(domain="kpi-report")
+        part = MIMEPart()
+        part.set_content(PAYLOAD_TEXT["inline"])
+        part.add_alternative(
+            f'<html><body><h2>Nokia KPIs Report</h2><img src="cid:{cid[1:-1]}" alt="KPI chart">{tables}</body></html>',
+            subtype="html",
+        )
+        part.get_payload()[1].add_related(reduce_png(png), "image", "png", cid=cid)
+        return part
+    return _cached_part(("inline", hashlib.sha256(png).hexdigest(), summary), build)
+
+def report_parts(settings, payload: str | None = None, ppt_path: Path | None = None) -> list:
+    """Body + attachment parts for a report email.
+
+    Files are taken straight from the artifact cache (built there if
+    missing), never from the shared report.pptx/chart.png, so sends for
+    different profiles can run at the same time.
+    """
+    from project_pipeline.report_pipeline import PdfSink, PngSink, ReportPipeline
+    payload = payload or settings.email_payload
+
+    if payload == "pptx":
+        if ppt_path is None:
+            from project_pipeline.ppt_export import export_to_ppt
+            ppt_path = export_to_ppt(settings=settings)
+        return [_text_part(payload), attachment_part(ppt_path)]
+    if payload == "pdf":
+        return [_text_part(payload), attachment_part(ReportPipeline([PdfSink()]).run(settings, publish=False)["pdf"])]
+    if payload == "png":
+        return [_text_part(payload), attachment_part(ReportPipeline([PngSink()]).run(settings, publish=False)["png"], reduce=True)]
+    if payload == "inline":
+        pipeline = ReportPipeline([PngSink()])
+        return [inline_part(pipeline.run(settings, publish=False)["png"], pipeline.compute(settings))]
+    raise ValueError(f"Unsupported email payload: {payload}")
+
+def build_report_message(recipient: str, parts: list) -> EmailMessage:
+    """Report email for one recipient (each gets its own To header; `parts` are shared)."""
     msg = EmailMessage()
     msg["Subject"] = "Nokia KPIs Report"
     msg["From"] = SMTP_FROM
-    msg["To"] = ", ".join(recipients)
-    msg.set_content("Attached is the latest KPI report in PowerPoint format.")
-
-    # Attach PowerPoint file
-    with open(PPT_PATH, "rb") as f:
-        msg.add_attachment(
-            f.read(),
-            maintype="application",
-            subtype="vnd.openxmlformats-officedocument.presentationml.presentation",
-            filename=PPT_PATH.name,
-        )
+    msg["To"] = recipient
+    msg.make_mixed()
+    for part in parts:
+        msg.attach(part)
+    return msg
+
+def send_email_report(ppt_path: Path | None = None, settings=None, pool: SMTPPool | None = None, payload: str | None = None):
+    # Load recipients from settings.json (unless the caller already has them)
+    settings = settings or data_store.get_settings()
+
+    recipients = settings.mailing_list.split(";")
+    recipients = [r.strip() for r in recipients if r.strip()]  # Clean up emails
+
+    if not recipients:
+        raise ValueError("No recipients in settings.json mailing_list")
 
-    # Send email securely using SSL
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context) as server:
-        server.login(SMTP_USER, SMTP_PASS)
-        server.send_message(msg)
+    # Encoded once, then shared by one message per recipient over pooled connections
+    parts = report_parts(settings, payload, ppt_path)
+    messages = [build_report_message(r, parts) for r in recipients]
+    failed = (pool or smtp_pool).send_many(messages)
+    if failed:
+        raise EmailDeliveryError(failed)
 
     print(f"Report sent to {recipients}")
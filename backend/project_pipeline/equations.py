@@ -0,0 +1,214 @@
+import numpy as np
+import re
+from functools import lru_cache
+
+# Tokens: numbers, KPI names, + - * / and parentheses
+TOKEN_RE = re.compile(r"\s*(?:(\d+\.?\d*|\.\d+)|([A-Za-z_][A-Za-z0-9_]*)|([-+*/()]))")
+
+# Binary operators in the AST
+OPS = {"+": "add", "-": "sub", "*": "mul", "/": "div"}
+
+class EquationError(ValueError):
+    """Raised for equations that can't be parsed or reference unknown KPIs."""
+
+def _tokenize(equation: str) -> list:
+    """Split an equation into (kind, text) tokens."""
+    tokens, pos = [], 0
+    equation = equation.rstrip()
+    while pos < len(equation):
+        m = TOKEN_RE.match(equation, pos)
+        if not m:
+            raise EquationError(f"Invalid character at position {pos} in equation: {equation}")
+        number, name, op = m.groups()
+        if number is not None:
+            tokens.append(("num", number))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("op", op))
+        pos = m.end()
+    return tokens
+
+class _Parser:
+    """Recursive-descent parser producing a tuple AST.
+
+    expr   := term (('+' | '-') term)*
+    term   := factor (('*' | '/') factor)*
+    factor := ('+' | '-') factor | number | name | '(' expr ')'
+    """
+
+    def __init__(self, equation: str):
+        self.equation = equation
+        self.tokens = _tokenize(equation)
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _next(self):
+        tok = self._peek()
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        if not self.tokens:
+            raise EquationError("Equation is empty")
+        node = self._expr()
+        if self.pos != len(self.tokens):
+            raise EquationError(f"Unexpected '{self._peek()[1]}' in equation: {self.equation}")
+        return node
+
+    def _expr(self):
+        node = self._term()
+        while self._peek() in (("op", "+"), ("op", "-")):
+            op = self._next()[1]
+            node = (OPS[op], node, self._term())
+        return node
+
+    def _term(self):
+        node = self._factor()
+        while self._peek() in (("op", "*"), ("op", "/")):
+            op = self._next()[1]
+            node = (OPS[op], node, self._factor())
+        return node
+
+    def _factor(self):
+        kind, text = self._next()
+        if kind == "op" and text in "+-":
+            operand = self._factor()
+            return ("neg", operand) if text == "-" else operand
+        if kind == "num":
+            return ("num", float(text))
+        if kind == "name":
+            return ("col", text)
+        if kind == "op" and text == "(":
+            node = self._expr()
+            if self._next() != ("op", ")"):
+                raise EquationError(f"Missing ')' in equation: {self.equation}")
+            return node
+        raise EquationError(f"Unexpected end of equation: {self.equation}")
+
+def _divide(a, b):
+    """Element-wise a / b where division by zero gives NaN (not inf)."""
+    a, b = np.broadcast_arrays(np.asarray(a, dtype="float64"), np.asarray(b, dtype="float64"))
+    out = np.full(a.shape, np.nan)
+    np.divide(a, b, out=out, where=(b != 0))
+    return out if out.ndim else float(out)
+
+_BINARY = {
+    "add": np.add,
+    "sub": np.subtract,
+    "mul": np.multiply,
+    "div": _divide,
+}
+
+def _build(node):
+    """Turn an AST node into a closure over a {column: array} mapping."""
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda cols: value
+    if kind == "col":
+        name = node[1]
+        return lambda cols: cols[name]
+    if kind == "neg":
+        inner = _build(node[1])
+        return lambda cols: np.negative(inner(cols))
+    fn, left, right = _BINARY[kind], _build(node[1]), _build(node[2])
+    return lambda cols: fn(left(cols), right(cols))
+
+def _names(node, out: list) -> list:
+    """Collect referenced column names in first-use order."""
+    if node[0] == "col":
+        if node[1] not in out:
+            out.append(node[1])
+    elif node[0] != "num":
+        for child in node[1:]:
+            _names(child, out)
+    return out
+
+def _canonical(node):
+    """Normalize an AST so equal subexpressions compare equal (operands of + and * are ordered)."""
+    kind = node[0]
+    if kind in ("num", "col"):
+        return node
+    children = [_canonical(child) for child in node[1:]]
+    if kind in ("add", "mul"):
+        children.sort(key=repr)
+    return (kind, *children)
+
+def _post_order(node, seen: dict) -> None:
+    """Add each distinct subexpression to `seen` after its operands."""
+    if node in seen:
+        return
+    if node[0] not in ("num", "col"):
+        for child in node[1:]:
+            _post_order(child, seen)
+    seen[node] = None
+
+class CompiledEquation:
+    """A parsed KPI equation that evaluates over NumPy arrays.
+
+    NaN inputs propagate to NaN outputs, and division by zero yields NaN.
+    """
+
+    def __init__(self, equation: str):
+        self.equation = equation
+        self.ast = _Parser(equation).parse()
+        self.columns = tuple(_names(self.ast, []))
+        self._fn = _build(self.ast)
+
+    def evaluate(self, columns) -> np.ndarray:
+        """Evaluate with `columns` mapping each referenced KPI name to an array."""
+        with np.errstate(invalid="ignore", over="ignore"):
+            return self._fn({name: np.asarray(columns[name], dtype="float64") for name in self.columns})
+
+@lru_cache(maxsize=256)
+def compile_equation(equation: str) -> CompiledEquation:
+    """Parse an equation once; repeated calls with the same string are free."""
+    return CompiledEquation(equation)
+
+class CompiledBatch:
+    """Several equations compiled into one program that shares common subexpressions.
+
+    Every distinct subexpression (after normalization) is evaluated exactly
+    once, so adding derived series that reuse the same terms is nearly free.
+    """
+
+    def __init__(self, equations: tuple):
+        self.equations = equations
+        self.roots = [_canonical(compile_equation(eq).ast) for eq in equations]
+        steps = {}
+        for root in self.roots:
+            _post_order(root, steps)
+        self.steps = list(steps)
+        self.columns = tuple(dict.fromkeys(n[1] for n in self.steps if n[0] == "col"))
+
+    def evaluate(self, columns) -> dict:
+        """Evaluate all equations; returns {equation: array}."""
+        results = {}
+        with np.errstate(invalid="ignore", over="ignore"):
+            for node in self.steps:
+                kind = node[0]
+                if kind == "num":
+                    results[node] = node[1]
+                elif kind == "col":
+                    results[node] = np.asarray(columns[node[1]], dtype="float64")
+                elif kind == "neg":
+                    results[node] = np.negative(results[node[1]])
+                else:
+                    results[node] = _BINARY[kind](results[node[1]], results[node[2]])
+        return {eq: results[root] for eq, root in zip(self.equations, self.roots)}
+
+@lru_cache(maxsize=64)
+def compile_batch(equations: tuple) -> CompiledBatch:
+    """Compile a tuple of equations into a single shared program (cached)."""
+    return CompiledBatch(equations)
+
+def validate_equation(equation: str, allowed) -> CompiledEquation:
+    """Compile an equation and check every identifier is in `allowed`."""
+    compiled = compile_equation(equation)
+    unknown = [name for name in compiled.columns if name not in allowed]
+    if unknown:
+        raise EquationError(f"Unknown KPI(s) {', '.join(unknown)} in equation: {equation}")
+    return compiled
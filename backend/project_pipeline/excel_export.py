@@ -1,81 +1,123 @@
 import pandas as pd
-import json
+import numpy as np
 from pathlib import Path
-import re
-import xlwings as xw
+import os
+
+from project_pipeline import data_store, rollups, site_store
+from project_pipeline.chart_render import COLOR_MAP, DEFAULT_BAR_COLOR, DEFAULT_LINE_COLOR, axis_ranges, render_chart_png
+from project_pipeline.equations import compile_batch, compile_equation
+from project_pipeline.settings_model import Settings
 
 # Define file paths
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATASET_PATH = BASE_DIR / "cleaned_dataset.csv"   
-SETTINGS_PATH = BASE_DIR / "settings.json"        
 OUTPUT_PATH = BASE_DIR / "report.xlsx"            
 CHART_IMG = BASE_DIR / "chart.png"         
 
-# Hardcoded colors for KPIs and equations
-COLOR_MAP = {
-    "kpi001": "#1f77b4",   # blue
-    "kpi002": "#ff7f0e",   # orange
-    "kpi003": "#23e923",   # green
-    "kpi004": "#d62728",   # red
-    "kpi005": "#9467bd",   # purple
-    "kpi006": "#8c564b",   # brown
-    "kpi007": "#9DC9CC",   # pink
-    "kpi008": "#962491",   # gray
-    "kpi009": "#bcbd22",   # olive
-    "line_equation": "#CC9D9D",  # light red for line equation
-    "bar_equation": "#403F40",   # dark gray for bar equation
-}
+# PNG renderer: "matplotlib" (headless, default) or "excel" (drives Excel via xlwings)
+CHART_RENDERER = os.getenv("CHART_RENDERER", "matplotlib")
 
 def safe_eval_equation(df: pd.DataFrame, equation: str) -> pd.Series:
-    """Safely evaluate simple KPI equations (no builtins allowed)."""
-    allowed = {col: df[col] for col in df.columns if col != "date"} 
-    pattern = r"^[\dkpi+\-*/().\s]+$" 
-    if not re.match(pattern, equation):
-        raise ValueError(f"Invalid equation: {equation}")
-    return eval(equation, {"__builtins__": {}}, allowed) 
-
-def generate_excel_report():
-    # Load dataset and settings
-    df = pd.read_csv(DATASET_PATH, parse_dates=["date"])
-    with open(SETTINGS_PATH, "r") as f:
-        settings = json.load(f)
-        # Ensure chart config exists
-        if not settings.get("line_chart"):
-            settings["line_chart"] = {"type": "list", "value": []}
-        if not settings.get("bar_chart"):
-            settings["bar_chart"] = {"type": "list", "value": []}
-
-    # Apply days_back filter (limit rows)
-    days_back = settings.get("days_back", 0)
-    if days_back > 0:
-        df = df.sort_values("date").tail(days_back)
-
-    # Prepare chart data
-    line_data, bar_data = pd.DataFrame(), pd.DataFrame()
-
-    # Handle line chart data
-    if settings["line_chart"]["type"] == "equation":
-        eq = settings["line_chart"]["value"]
-        if eq:
-            df["line_equation"] = safe_eval_equation(df, eq)
-            line_data = df[["line_equation"]]
-    elif settings["line_chart"]["type"] == "list" and settings["line_chart"]["value"]:
-        line_data = df[settings["line_chart"]["value"]]
-
-    # Handle bar chart data
-    if settings["bar_chart"]["type"] == "equation":
-        eq = settings["bar_chart"]["value"]
-        if eq:
-            df["bar_equation"] = safe_eval_equation(df, eq)
-            bar_data = df[["bar_equation"]]
-    elif settings["bar_chart"]["type"] == "list" and settings["bar_chart"]["value"]:
-        bar_data = df[settings["bar_chart"]["value"]]
-
+    """Evaluate a KPI equation over the referenced columns of `df` (compiled once, no eval)."""
+    compiled = compile_equation(equation)
+    missing = [col for col in compiled.columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown KPI(s) {', '.join(missing)} in equation: {equation}")
+    values = compiled.evaluate({col: df[col].to_numpy() for col in compiled.columns})
+    return pd.Series(np.broadcast_to(values, len(df)), index=df.index, dtype="float64")
+
+def chart_series(settings: Settings) -> tuple:
+    """(name, expression) pairs for the line and bar charts."""
+    return settings.line_chart.series("line_equation"), settings.bar_chart.series("bar_equation")
+
+def referenced_columns(settings: Settings) -> list:
+    """KPI columns used by the line/bar chart settings (in first-use order)."""
+    line_series, bar_series = chart_series(settings)
+    exprs = tuple(dict.fromkeys(expr for _, expr in line_series + bar_series))
+    return list(compile_batch(exprs).columns)
+
+def compute_chart_data(df: pd.DataFrame, settings: Settings) -> tuple:
+    """Evaluate every line/bar series in one pass; returns (line_data, bar_data)."""
+    line_series, bar_series = chart_series(settings)
+    exprs = tuple(dict.fromkeys(expr for _, expr in line_series + bar_series))
+    batch = compile_batch(exprs)
+
+    missing = [col for col in batch.columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown KPI(s) in chart settings: {', '.join(missing)}")
+    values = batch.evaluate({col: df[col].to_numpy() for col in batch.columns})
+
+    def frame(series):
+        if not series:
+            return pd.DataFrame()
+        return pd.DataFrame(
+            {name: np.broadcast_to(values[expr], len(df)) for name, expr in series},
+            index=df.index,
+        )
+
+    return frame(line_series), frame(bar_series)
+
+# Distance between consecutive rows at each granularity (rolling-window lookback)
+PERIOD_STEP = {"daily": pd.DateOffset(days=1), "weekly": pd.DateOffset(weeks=1), "monthly": pd.DateOffset(months=1)}
+
+def report_window(settings: Settings, last_date=None) -> tuple:
+    """Inclusive (start, end) dates a report covers; None means unbounded.
+
+    Explicit start_date/end_date win; otherwise it is the last `days_back`
+    calendar days up to the newest date (or end_date), so gaps in the data
+    don't stretch the window.
+    """
+    end = pd.Timestamp(settings.end_date) if settings.end_date else None
+    if settings.start_date:
+        start = pd.Timestamp(settings.start_date)
+    elif settings.days_back > 0 and last_date is not None:
+        anchor = min(end, last_date) if end is not None else last_date
+        start = anchor - pd.Timedelta(days=settings.days_back - 1)
+    else:
+        start = None
+    # Rolled-up reports include the whole week/month the window starts in
+    if start is not None and settings.granularity != "daily":
+        start = rollups.period_start(pd.Series([start]), settings.granularity).iloc[0]
+    return start, end
+
+def build_chart_data(settings: Settings | None = None) -> tuple:
+    """Load settings + dataset and compute (dates, line_data, bar_data) for the charts."""
+    # Load settings and only the KPI columns the charts need (cached in memory)
+    settings = settings or data_store.get_settings()
+    columns = referenced_columns(settings)
+
+    # Report window, plus enough earlier periods to fill the rolling window
+    start, end = report_window(settings, data_store.date_range()[1])
+    fetch_start = start
+    if start is not None and settings.rolling_window > 1:
+        fetch_start = start - PERIOD_STEP[settings.granularity] * (settings.rolling_window - 1)
+
+    if settings.sites:
+        # Site-filtered report: aggregate the per-site store on demand
+        df = site_store.query_sites(settings.sites, fetch_start, end, columns)
+        if settings.granularity != "daily":
+            df = rollups.finalize(rollups.rollup(df, settings.granularity), settings.rollup_agg)
+    elif settings.granularity != "daily":
+        df = data_store.get_rollup(settings.granularity, columns, settings.rollup_agg)
+        df = df.iloc[data_store.date_slice(df["date"], fetch_start, end)]
+    else:
+        df = data_store.get_dataset(columns, fetch_start, end)
+
+    # Prepare chart data (all series evaluated together)
+    line_data, bar_data = compute_chart_data(df, settings)
+    line_data = rollups.add_rolling_stats(line_data, settings.rolling_window, settings.percentile_bands)
+
+    if fetch_start != start:
+        rows = data_store.date_slice(df["date"], start)
+        df, line_data, bar_data = df.iloc[rows], line_data.iloc[rows], bar_data.iloc[rows]
+    return df["date"], line_data, bar_data
+
+def write_excel_report(dates, line_data: pd.DataFrame, bar_data: pd.DataFrame, path: Path = OUTPUT_PATH) -> Path:
+    """Write the series to an xlsx workbook with the combined bar + line chart."""
     # Merge into final dataset
-    combined = pd.concat([df[["date"]], line_data, bar_data], axis=1)
+    combined = pd.concat([dates.to_frame(), line_data, bar_data], axis=1)
 
     # Write data to Excel
-    with pd.ExcelWriter(OUTPUT_PATH, engine="xlsxwriter", datetime_format="dd-mmm") as writer:
+    with pd.ExcelWriter(path, engine="xlsxwriter", datetime_format="dd-mmm") as writer:
         combined.to_excel(writer, sheet_name="Report", index=False)
 
         workbook = writer.book
@@ -92,21 +134,20 @@ def generate_excel_report():
             "num_format": "dd-mmm",
         })
 
-        # Auto-scale chart ranges
-        bar_min, bar_max = (bar_data.min().min(), bar_data.max().max()) if not bar_data.empty else (0, 1)
-        line_min, line_max = (line_data.min().min(), line_data.max().max()) if not line_data.empty else (0, 1)
+        # Auto-scale chart ranges (same scaling as the PNG renderer)
+        (bar_min, bar_max), (line_min, line_max) = axis_ranges(line_data, bar_data)
 
         # Bar chart left axis
         bar_chart.set_y_axis({
             "name": "Bar Values",
             "major_gridlines": {"visible": False},
-            "min": int(bar_min * 0.95),
-            "max": int(bar_max * 1.05),
+            "min": bar_min,
+            "max": bar_max,
         })
 
         # Add bar series
         for j, col in enumerate(bar_data.columns, 1 + line_data.shape[1]):
-            color = COLOR_MAP.get(col, "#ff0000")
+            color = COLOR_MAP.get(col, DEFAULT_BAR_COLOR)
             bar_chart.add_series({
                 "name":       ["Report", 0, j],
                 "categories": ["Report", 1, 0, len(combined), 0],
@@ -123,13 +164,13 @@ def generate_excel_report():
         line_chart.set_y2_axis({
             "name": "Line Values",
             "major_gridlines": {"visible": True},
-            "min": int(line_min * 0.9),
-            "max": int(line_max * 1.05),
+            "min": line_min,
+            "max": line_max,
         })
 
         # Add line series
         for i, col in enumerate(line_data.columns, 1):
-            color = COLOR_MAP.get(col, "#0000ff")
+            color = COLOR_MAP.get(col, DEFAULT_LINE_COLOR)
             line_chart.add_series({
                 "name":       ["Report", 0, i],
                 "categories": ["Report", 1, 0, len(combined), 0],
@@ -144,18 +185,33 @@ def generate_excel_report():
         bar_chart.set_legend({"position": "right"})
         worksheet.insert_chart("H10", bar_chart)
 
-    print(f"Excel report generated : {OUTPUT_PATH}")
+    return Path(path)
+
+def export_chart_png(dates, line_data: pd.DataFrame, bar_data: pd.DataFrame, path: Path = CHART_IMG, xlsx_path: Path = OUTPUT_PATH) -> Path:
+    """Write chart.png with the configured renderer (the excel renderer needs `xlsx_path` written first)."""
+    if CHART_RENDERER == "excel":
+        export_chart_with_excel(xlsx_path, path)
+    else:
+        render_chart_png(dates, line_data, bar_data, path)
+    return Path(path)
+
+def generate_excel_report():
+    """Build report.xlsx + chart.png (copied from the artifact cache if nothing changed)."""
+    from project_pipeline.report_pipeline import ReportPipeline, XlsxSink, PngSink
+    return ReportPipeline([XlsxSink(), PngSink()]).run()
+
+def export_chart_with_excel(xlsx_path: Path = OUTPUT_PATH, png_path: Path = CHART_IMG):
+    """Export the chart in report.xlsx as PNG by driving Excel (needs Office + xlwings)."""
+    import xlwings as xw
 
-    # Export chart as PNG using xlwings
     wb = None
     app = None
     try:
         app = xw.App(visible=False)  
-        wb = xw.Book(OUTPUT_PATH)
+        wb = xw.Book(xlsx_path)
         ws = wb.sheets["Report"]
         chart = ws.charts[0]
-        chart.api[1].Export(str(BASE_DIR / "chart.png"))
-        print(f"Chart exported as PNG: {CHART_IMG}")
+        chart.api[1].Export(str(png_path))
 
     except Exception as e:
         print(f"Excel export failed: {e}")
@@ -164,4 +220,3 @@ def generate_excel_report():
             wb.close()
         if app is not None:
             app.quit()
-
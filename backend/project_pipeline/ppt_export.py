@@ -1,25 +1,169 @@
 from pptx import Presentation
+from pptx.chart.axis import ValueAxis
+from pptx.chart.data import CategoryChartData
+from pptx.dml.color import RGBColor
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION, XL_MARKER_STYLE
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls, qn
 from pptx.util import Inches
 from pathlib import Path
+import math
+import os
+
+from project_pipeline.chart_render import COLOR_MAP, DEFAULT_BAR_COLOR, DEFAULT_LINE_COLOR, axis_ranges
 
 # Define file paths
 BASE_DIR = Path(__file__).resolve().parent.parent
-PPT_PATH = BASE_DIR / "report.pptx"  
-CHART_IMG = BASE_DIR / "chart.png"   
+PPT_PATH = BASE_DIR / "report.pptx"
+CHART_IMG = BASE_DIR / "chart.png"
+
+# "image" embeds chart.png, "native" builds an editable PowerPoint chart from the series data
+PPT_CHART_MODE = os.getenv("PPT_CHART_MODE", "image")
+
+# Axis ids for the secondary (line) axes added next to the column chart's own axes
+LINE_CAT_AX_ID = "50010"
+LINE_VAL_AX_ID = "50020"
+
+def _rgb(hex_color: str) -> RGBColor:
+    return RGBColor.from_string(hex_color.lstrip("#").upper())
+
+def _values(series) -> list:
+    """Chart values with NaN as gaps."""
+    return [None if v is None or (isinstance(v, float) and math.isnan(v)) else float(v) for v in series]
+
+def _move_to_secondary_line_chart(chart, n_line: int) -> None:
+    """Move the last `n_line` series of the column chart into a lineChart on a second value axis."""
+    plot_area = chart._chartSpace.chart.plotArea
+    bar_chart = plot_area.find(qn("c:barChart"))
+    sers = bar_chart.findall(qn("c:ser"))[len(bar_chart.findall(qn("c:ser"))) - n_line:]
+
+    line_chart = parse_xml(
+        f'<c:lineChart {nsdecls("c")}>'
+        '<c:grouping val="standard"/><c:varyColors val="0"/>'
+        f'<c:marker val="1"/><c:axId val="{LINE_CAT_AX_ID}"/><c:axId val="{LINE_VAL_AX_ID}"/>'
+        '</c:lineChart>'
+    )
+    marker = line_chart.find(qn("c:marker"))
+    for ser in sers:
+        # invertIfNegative is only valid on bar series
+        for el in ser.findall(qn("c:invertIfNegative")):
+            ser.remove(el)
+        marker.addprevious(ser)
+    bar_chart.addnext(line_chart)
+
+    # Hidden category axis + visible value axis on the right for the lines
+    last_ax = plot_area.findall(qn("c:valAx"))[-1]
+    last_ax.addnext(parse_xml(
+        f'<c:valAx {nsdecls("c")}>'
+        f'<c:axId val="{LINE_VAL_AX_ID}"/><c:scaling><c:orientation val="minMax"/></c:scaling>'
+        '<c:delete val="0"/><c:axPos val="r"/><c:majorGridlines/>'
+        '<c:numFmt formatCode="General" sourceLinked="1"/>'
+        '<c:majorTickMark val="out"/><c:minorTickMark val="none"/><c:tickLblPos val="nextTo"/>'
+        f'<c:crossAx val="{LINE_CAT_AX_ID}"/><c:crosses val="max"/><c:crossBetween val="between"/>'
+        '</c:valAx>'
+    ))
+    last_ax.addnext(parse_xml(
+        f'<c:dateAx {nsdecls("c")}>'
+        f'<c:axId val="{LINE_CAT_AX_ID}"/><c:scaling><c:orientation val="minMax"/></c:scaling>'
+        '<c:delete val="1"/><c:axPos val="b"/><c:numFmt formatCode="dd-mmm" sourceLinked="0"/>'
+        '<c:majorTickMark val="none"/><c:minorTickMark val="none"/><c:tickLblPos val="nextTo"/>'
+        f'<c:crossAx val="{LINE_VAL_AX_ID}"/><c:crosses val="autoZero"/><c:auto val="1"/>'
+        '<c:lblOffset val="100"/><c:baseTimeUnit val="days"/>'
+        '</c:dateAx>'
+    ))
+
+def add_native_chart(slide, dates, line_data, bar_data):
+    """Add a clustered column + line (secondary axis) chart built from the series data.
+
+    An empty report window (no dates or no series) gets a note instead of a chart.
+    """
+    if not len(dates) or not (len(bar_data.columns) + len(line_data.columns)):
+        box = slide.shapes.add_textbox(Inches(1), Inches(3), Inches(8), Inches(1))
+        box.text_frame.text = "No KPI data in the selected report window"
+        return None
+
+    chart_data = CategoryChartData()
+    chart_data.categories = [d.date() for d in dates]
+    chart_data.categories.number_format = "dd-mmm"
+    for col in list(bar_data.columns) + list(line_data.columns):
+        data = bar_data[col] if col in bar_data.columns else line_data[col]
+        chart_data.add_series(col, _values(data))
+
+    frame = slide.shapes.add_chart(
+        XL_CHART_TYPE.COLUMN_CLUSTERED, Inches(1), Inches(1), Inches(8), Inches(5), chart_data
+    )
+    chart = frame.chart
+    if len(line_data.columns):
+        _move_to_secondary_line_chart(chart, len(line_data.columns))
+
+    chart.has_title = True
+    chart.chart_title.text_frame.text = "KPI Chart"
+    chart.has_legend = True
+    chart.legend.position = XL_LEGEND_POSITION.RIGHT
+    chart.legend.include_in_layout = False
+
+    # Same axis scaling as the Excel chart and PNG
+    (bar_min, bar_max), (line_min, line_max) = axis_ranges(line_data, bar_data)
+    value_axis = chart.value_axis
+    value_axis.minimum_scale, value_axis.maximum_scale = bar_min, bar_max
+    value_axis.has_major_gridlines = False
+    value_axis.has_title = True
+    value_axis.axis_title.text_frame.text = "Bar Values"
+    chart.category_axis.has_title = True
+    chart.category_axis.axis_title.text_frame.text = "Date"
+
+    if len(line_data.columns):
+        line_axis = ValueAxis(chart._chartSpace.chart.plotArea.findall(qn("c:valAx"))[-1])
+        line_axis.minimum_scale, line_axis.maximum_scale = line_min, line_max
+        line_axis.has_title = True
+        line_axis.axis_title.text_frame.text = "Line Values"
+
+    # Series colors (bars first, then lines)
+    bar_plot = chart.plots[0]
+    for series in bar_plot.series:
+        color = _rgb(COLOR_MAP.get(series.name, DEFAULT_BAR_COLOR))
+        series.format.fill.solid()
+        series.format.fill.fore_color.rgb = color
+        series.format.line.color.rgb = color
+    if len(line_data.columns):
+        for series in chart.plots[1].series:
+            color = _rgb(COLOR_MAP.get(series.name, DEFAULT_LINE_COLOR))
+            series.smooth = False
+            series.format.line.color.rgb = color
+            series.marker.style = XL_MARKER_STYLE.CIRCLE
+            series.marker.format.fill.solid()
+            series.marker.format.fill.fore_color.rgb = color
+            series.marker.format.line.color.rgb = color
+    return chart
+
+def write_ppt(path: Path = PPT_PATH, mode: str | None = None, chart_data: tuple | None = None, image: Path = CHART_IMG) -> Path:
+    """Write the report deck; native mode needs `chart_data` = (dates, line_data, bar_data)."""
+    mode = mode or PPT_CHART_MODE
 
-def export_to_ppt():
     # Create new PowerPoint presentation
     prs = Presentation()
     slide_layout = prs.slide_layouts[5]   # Blank slide layout
     slide = prs.slides.add_slide(slide_layout)
 
-    # Add chart image to slide (position + size in inches)
-    slide.shapes.add_picture(str(CHART_IMG), Inches(1), Inches(1), Inches(8), Inches(5))
+    if mode == "native":
+        # Build the chart straight from the series data (no Excel, no PNG round-trip)
+        add_native_chart(slide, *chart_data)
+    else:
+        # Add chart image to slide (position + size in inches)
+        slide.shapes.add_picture(str(image), Inches(1), Inches(1), Inches(8), Inches(5))
+
+    path = Path(path)
+    prs.save(path)
+    return path
 
-    # Remove old file if exists before saving
-    if PPT_PATH.exists():
-        PPT_PATH.unlink()
-    prs.save(PPT_PATH)
+def export_to_ppt(mode: str | None = None, settings=None):
+    """Export the report deck; `mode` is "image" or "native" (defaults to PPT_CHART_MODE).
 
-    print(f"PowerPoint exported: {PPT_PATH}")
-    return PPT_PATH
+    Uses the saved settings and writes report.pptx, reusing the cached deck
+    when settings and data haven't changed. With explicit `settings` (e.g. a
+    profile) report.pptx is left alone and the artifact-cache entry is returned.
+    """
+    from project_pipeline.report_pipeline import ReportPipeline, PngSink, PptxSink
+    sink = PptxSink(mode=mode or PPT_CHART_MODE)
+    sinks = [sink] if sink.mode == "native" else [PngSink(), sink]
+    return ReportPipeline(sinks).run(settings, publish=settings is None)["pptx"]
@@ -0,0 +1,113 @@
+import itertools
+import threading
+import traceback
+from datetime import datetime
+
+from project_pipeline.report_pipeline import regenerate_reports
+from project_pipeline.settings_model import Settings
+
+# How many finished jobs to remember for the status endpoint
+JOB_HISTORY = 50
+
+class ReportJobQueue:
+    """Regenerates reports on one background thread.
+
+    Saves that arrive while a build is queued replace it (only the latest
+    settings are rendered); the replaced jobs are marked "superseded".
+    """
+
+    def __init__(self, run=regenerate_reports):
+        self._run = run
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._jobs = {}            # job id -> job dict (bounded history)
+        self._pending = None       # (job id, settings) waiting to run
+        self._artifacts = {}       # artifact name -> {"version", "path", "updated_at"}
+        self._thread = None
+        self._stopping = False
+
+    def _now(self) -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._worker, name="report-jobs", daemon=True)
+            self._thread.start()
+
+    def submit(self, settings: Settings | None = None) -> dict:
+        """Queue a rebuild for `settings` and return the new job (doesn't wait)."""
+        with self._cond:
+            job_id = next(self._ids)
+            if self._pending is not None:
+                self._jobs[self._pending[0]].update(status="superseded", superseded_by=job_id, finished_at=self._now())
+            self._jobs[job_id] = {"id": job_id, "status": "queued", "queued_at": self._now()}
+            self._pending = (job_id, settings)
+            self._trim()
+            self._ensure_worker()
+            self._cond.notify()
+            return dict(self._jobs[job_id])
+
+    def _trim(self) -> None:
+        for old in sorted(self._jobs)[:-JOB_HISTORY]:
+            if self._jobs[old]["status"] not in ("queued", "running"):
+                del self._jobs[old]
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job_id, settings = self._pending
+                self._pending = None
+                self._jobs[job_id].update(status="running", started_at=self._now())
+
+            try:
+                results = self._run(settings)
+                error = None
+            except Exception as e:
+                traceback.print_exc()
+                results, error = {}, str(e)
+
+            with self._cond:
+                job = self._jobs.get(job_id, {})
+                job.update(status="failed" if error else "done", finished_at=self._now())
+                if error:
+                    job["error"] = error
+                for name, path in (results or {}).items():
+                    version = self._artifacts.get(name, {}).get("version", 0) + 1
+                    self._artifacts[name] = {"version": version, "path": str(path), "updated_at": job["finished_at"], "job_id": job_id}
+                self._cond.notify_all()
+
+    def job(self, job_id: int) -> dict | None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def status(self) -> dict:
+        """Latest job plus the current version of every artifact."""
+        with self._cond:
+            latest = self._jobs[max(self._jobs)] if self._jobs else None
+            return {
+                "latest_job": dict(latest) if latest else None,
+                "pending": self._pending is not None,
+                "artifacts": {name: dict(info) for name, info in self._artifacts.items()},
+            }
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until nothing is queued or running (used at startup and in tools)."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and all(j["status"] != "running" for j in self._jobs.values()),
+                timeout,
+            )
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+# Shared queue used by the API
+report_jobs = ReportJobQueue()
@@ -0,0 +1,194 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import ExitStack
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+import os
+import tempfile
+import threading
+import pandas as pd
+
+from project_pipeline import artifact_cache, data_store
+from project_pipeline.chart_render import render_chart_pdf
+from project_pipeline.excel_export import (
+    BASE_DIR,
+    CHART_IMG,
+    CHART_RENDERER,
+    OUTPUT_PATH,
+    build_chart_data,
+    export_chart_png,
+    write_excel_report,
+)
+from project_pipeline.ppt_export import PPT_CHART_MODE, PPT_PATH, write_ppt
+from project_pipeline.settings_model import Settings
+
+# Per-profile artifacts go to reports/<profile>/
+REPORTS_DIR = BASE_DIR / "reports"
+REPORT_PDF = BASE_DIR / "report.pdf"
+
+@dataclass
+class ReportData:
+    """Everything the sinks need, computed once per run."""
+    settings: Settings
+    dates: pd.Series
+    line_data: pd.DataFrame
+    bar_data: pd.DataFrame
+
+    @property
+    def chart_data(self) -> tuple:
+        return self.dates, self.line_data, self.bar_data
+
+def _write_atomically(path: Path, write, done: str | None = None) -> Path:
+    """Call `write` with a temporary path next to `path`, then move the result into place.
+
+    Report files are read by other jobs and requests while they are rebuilt;
+    this way readers see the old file or the new one, never a partial file.
+    The writers don't log (they only see the temporary name): `done` is
+    printed with the final path instead.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}{path.suffix}")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    if done:
+        print(f"{done}: {path}")
+    return path
+
+# --- Sinks ---
+# A sink turns ReportData into one artifact. `requires` lists sinks whose
+# output it reads (e.g. an image-mode deck embeds the PNG); everything else
+# runs concurrently. Sinks with a `cache_name` are stored in the artifact cache.
+
+@dataclass
+class XlsxSink:
+    path: Path = OUTPUT_PATH
+    name: str = "xlsx"
+    requires: tuple = ()
+    cache_name: str = "report.xlsx"
+
+    def run(self, data: ReportData, results: dict) -> Path:
+        return _write_atomically(self.path, lambda tmp: write_excel_report(*data.chart_data, path=tmp), "Excel report generated")
+
+@dataclass
+class PngSink:
+    path: Path = CHART_IMG
+    name: str = "png"
+    # The Excel renderer exports the chart from the written workbook
+    requires: tuple = ("xlsx",) if CHART_RENDERER == "excel" else ()
+    cache_name: str = "chart.png"
+
+    def run(self, data: ReportData, results: dict) -> Path:
+        xlsx = results.get("xlsx", OUTPUT_PATH)
+        return _write_atomically(self.path, lambda tmp: export_chart_png(*data.chart_data, path=tmp, xlsx_path=xlsx), "Chart exported as PNG")
+
+@dataclass
+class PptxSink:
+    path: Path = PPT_PATH
+    mode: str = PPT_CHART_MODE
+    name: str = "pptx"
+    requires: tuple = field(init=False)
+    cache_name: str = field(init=False)
+
+    def __post_init__(self):
+        self.requires = () if self.mode == "native" else ("png",)
+        self.cache_name = f"report.{self.mode}.pptx"
+
+    def run(self, data: ReportData, results: dict) -> Path:
+        image = results.get("png", CHART_IMG)
+        return _write_atomically(self.path, lambda tmp: write_ppt(tmp, self.mode, data.chart_data, image=image), "PowerPoint exported")
+
+@dataclass
+class PdfSink:
+    path: Path = REPORT_PDF
+    name: str = "pdf"
+    requires: tuple = ()
+    cache_name: str = "report.pdf"
+
+    def run(self, data: ReportData, results: dict) -> Path:
+        return _write_atomically(self.path, lambda tmp: render_chart_pdf(*data.chart_data, tmp), "PDF report exported")
+
+def default_sinks() -> list:
+    """xlsx + png + pptx (the artifacts regenerated on every settings change)."""
+    return [XlsxSink(), PngSink(), PptxSink()]
+
+def profile_sinks(name: str, mode: str | None = None) -> list:
+    """Sinks writing to reports/<name>/."""
+    out = REPORTS_DIR / data_store.check_profile_name(name)
+    out.mkdir(parents=True, exist_ok=True)
+    return [XlsxSink(out / OUTPUT_PATH.name), PngSink(out / CHART_IMG.name), PptxSink(out / PPT_PATH.name, mode or PPT_CHART_MODE)]
+
+class ReportPipeline:
+    """Load data + settings once, compute the series once, then fan out to sinks."""
+
+    def __init__(self, sinks: list | None = None, max_workers: int = 4):
+        self.sinks = sinks if sinks is not None else default_sinks()
+        self.max_workers = max_workers
+
+    def compute(self, settings: Settings | None = None) -> ReportData:
+        """Filtered and derived series for the current settings."""
+        settings = settings or data_store.get_settings()
+        dates, line_data, bar_data = build_chart_data(settings)
+        return ReportData(settings, dates, line_data, bar_data)
+
+    def run(self, settings: Settings | None = None, data: ReportData | None = None, use_cache: bool = True, publish: bool = True) -> dict:
+        """Run every sink (dependencies first, the rest concurrently); returns {sink name: result}.
+
+        Artifacts already built for the same settings + dataset are copied
+        from the artifact cache instead of being rebuilt. With `publish=False`
+        nothing is written to the sinks' usual paths: results are the cache
+        entries themselves (builds go through a private temporary directory),
+        so concurrent runs for other settings can't swap the files underneath.
+        """
+        settings = data.settings if data else (settings or data_store.get_settings())
+        if not publish and not use_cache:
+            raise ValueError("publish=False needs the artifact cache")
+        pending = {sink.name: sink for sink in self.sinks}
+        results, running = {}, {}
+
+        key = artifact_cache.build_key(settings, variant=CHART_RENDERER) if use_cache else None
+        if key:
+            for name, sink in list(pending.items()):
+                cached = sink.cache_name and artifact_cache.lookup(key, sink.cache_name)
+                if cached:
+                    results[name] = artifact_cache.publish(cached, sink.path) if publish else cached
+                    del pending[name]
+            if not pending:
+                print(f"Reports reused from cache ({key})")
+                return results
+
+        with ExitStack() as stack:
+            if not publish:
+                scratch = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="report-")))
+                pending = {
+                    name: replace(sink, path=scratch / Path(sink.path).name) if hasattr(sink, "path") else sink
+                    for name, sink in pending.items()
+                }
+            sinks = {**{s.name: s for s in self.sinks}, **pending}
+
+            data = data or self.compute(settings)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while pending or running:
+                    for name, sink in list(pending.items()):
+                        # A dependency that isn't part of this run is treated as already on disk
+                        if all(dep in results or (dep not in pending and dep not in running.values()) for dep in sink.requires):
+                            running[pool.submit(sink.run, data, results)] = name
+                            del pending[name]
+                    if not running:
+                        raise RuntimeError(f"Unsatisfiable sink dependencies: {list(pending)}")
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        # Re-raises the sink's exception (remaining sinks are abandoned)
+                        name = running.pop(future)
+                        results[name] = future.result()
+                        sink = sinks[name]
+                        if key and sink.cache_name:
+                            stored = artifact_cache.store(key, sink.cache_name, results[name])
+                            if not publish:
+                                results[name] = stored
+        return results
+
+def regenerate_reports(settings: Settings | None = None) -> dict:
+    """Rebuild report.xlsx, chart.png and report.pptx in one pass."""
+    return ReportPipeline().run(settings)
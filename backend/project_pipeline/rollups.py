@@ -0,0 +1,52 @@
+import pandas as pd
+
+# Period used for each coarser granularity (weeks start on Monday)
+ROLLUP_PERIODS = {"weekly": "W-SUN", "monthly": "M"}
+
+def period_start(dates: pd.Series, granularity: str) -> pd.Series:
+    """First day of the week/month each date falls in."""
+    return dates.dt.to_period(ROLLUP_PERIODS[granularity]).dt.start_time
+
+def rollup(daily: pd.DataFrame, granularity: str) -> pd.DataFrame:
+    """Per-period KPI sums and number of days with a value (`<kpi>_sum`, `<kpi>_days`).
+
+    Keeping sums and day counts (rather than means) lets a period be
+    recomputed or merged exactly when new days arrive.
+    """
+    kpi_cols = [c for c in daily.columns if c != "date"]
+    grouped = daily[kpi_cols].astype("float64").groupby(period_start(daily["date"], granularity))
+    out = pd.concat([grouped.sum().add_suffix("_sum"), grouped.count().add_suffix("_days")], axis=1)
+    out.index.name = "date"
+    return out.reset_index()
+
+def update_rollup(existing: pd.DataFrame | None, daily: pd.DataFrame, granularity: str, since=None) -> pd.DataFrame:
+    """Recompute only the periods from the one containing `since` onwards."""
+    if existing is None or since is None:
+        return rollup(daily, granularity)
+    start = period_start(pd.Series([pd.Timestamp(since)]), granularity).iloc[0]
+    kept = existing[existing["date"] < start]
+    fresh = rollup(daily[daily["date"] >= start], granularity)
+    return pd.concat([kept, fresh], ignore_index=True)
+
+def finalize(rolled: pd.DataFrame, how: str = "mean", columns: list | None = None) -> pd.DataFrame:
+    """Turn a sums/days rollup into one value per KPI and period (NaN where a period has no data)."""
+    kpis = [c[:-4] for c in rolled.columns if c.endswith("_sum")]
+    if columns is not None:
+        kpis = [c for c in columns if c in kpis]
+    out = pd.DataFrame({"date": rolled["date"]})
+    for kpi in kpis:
+        sums, days = rolled[f"{kpi}_sum"], rolled[f"{kpi}_days"]
+        value = sums / days if how == "mean" else sums
+        out[kpi] = value.where(days > 0)
+    return out
+
+def add_rolling_stats(data: pd.DataFrame, window: int, bands: list) -> pd.DataFrame:
+    """Append a rolling mean and rolling percentile bands for every series in `data`."""
+    if data.empty or window < 2:
+        return data
+    rolling = data.rolling(window, min_periods=1)
+    extra = {f"{col}_rolling_mean": rolling[col].mean() for col in data.columns}
+    for pct in bands:
+        q = rolling.quantile(pct / 100)
+        extra.update({f"{col}_p{pct:g}": q[col] for col in data.columns})
+    return pd.concat([data, pd.DataFrame(extra, index=data.index)], axis=1)
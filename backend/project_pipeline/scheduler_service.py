@@ -1,66 +1,242 @@
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.combining import OrTrigger
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-import json
+import os
+import socket
+import threading
+import time
+import uuid
 import pytz
+from sqlalchemy import Column, Float, MetaData, String, Table, create_engine, delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from project_pipeline.email_service import send_email_report
+from project_pipeline import artifact_cache, data_store
+from project_pipeline.email_outbox import email_outbox
 
-# Define paths
+# Jobs are persisted so they survive restarts; every API worker shares this store
 BASE_DIR = Path(__file__).resolve().parent.parent
-SETTINGS_PATH = BASE_DIR / "settings.json"
+SCHEDULER_DB_URL = os.getenv("SCHEDULER_DB_URL", f"sqlite:///{BASE_DIR / 'scheduler.db'}")
 
-# Scheduler (runs in background with Cairo timezone)
-scheduler = BackgroundScheduler(timezone="Africa/Cairo")
-scheduler.start()
+# Only the process holding the lease runs jobs; it renews every LEASE_SECONDS / 3
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
 
-def read_settings():
-    """Read settings.json config file."""
-    with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+# Reports are built this many minutes before each send, so the send only reads the cache
+PREGENERATE_MINUTES = float(os.getenv("PREGENERATE_MINUTES", "10"))
+# Pre-generated builds are pinned in the artifact cache until this long after the send is due
+PREGENERATE_PIN_SLACK = 15 * 60
 
-def schedule_email_job():
-    """Schedule email job based on settings.json."""
-    settings = read_settings()
-    freq = settings.get("frequency", "daily")   # daily / weekly / monthly
-    time_str = settings.get("time", "12:00") or "12:00"
-    days = settings.get("days", [])
-    hour, minute = map(int, time_str.split(":"))
-
-    # Clear old jobs before adding new one
-    scheduler.remove_all_jobs()
-    
-    # Create trigger depending on frequency
-    if freq == "daily":
-        trigger = CronTrigger(hour=hour, minute=minute)
+TIMEZONE = "Africa/Cairo"
+DEFAULT_PROFILE = "default"   # job key for settings.json; other keys are profile names
+
+engine = create_engine(SCHEDULER_DB_URL)
+
+# Scheduler (runs in background with Cairo timezone); started paused by start_scheduler()
+scheduler = BackgroundScheduler(
+    timezone=TIMEZONE,
+    jobstores={"default": SQLAlchemyJobStore(engine=engine)},
+    job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 300},
+)
+
+class LeaderLease:
+    """Time-limited lease in the job-store database: one holder at a time runs the jobs.
+
+    A holder that stops renewing (crash, shutdown) loses the lease after
+    `ttl` seconds and another process takes over.
+    """
+
+    metadata = MetaData()
+    table = Table(
+        "scheduler_lease", metadata,
+        Column("name", String(64), primary_key=True),
+        Column("holder", String(128), nullable=False),
+        Column("expires_at", Float, nullable=False),
+    )
+
+    def __init__(self, engine, name: str = "scheduler", ttl: float = LEASE_SECONDS):
+        self.engine, self.name, self.ttl = engine, name, ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.metadata.create_all(engine)
+
+    def acquire(self) -> bool:
+        """Take or renew the lease; False if another live holder has it."""
+        t, now = self.table, time.time()
+        with self.engine.begin() as conn:
+            renewed = conn.execute(
+                update(t)
+                .where(t.c.name == self.name, or_(t.c.holder == self.holder, t.c.expires_at < now))
+                .values(holder=self.holder, expires_at=now + self.ttl)
+            ).rowcount
+        if renewed:
+            return True
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(t).values(name=self.name, holder=self.holder, expires_at=now + self.ttl))
+            return True
+        except IntegrityError:
+            return False
+
+    def release(self) -> None:
+        t = self.table
+        with self.engine.begin() as conn:
+            conn.execute(delete(t).where(t.c.name == self.name, t.c.holder == self.holder))
+
+lease = LeaderLease(engine)
+_leader = False
+_stop = threading.Event()
+_lease_thread = None
+
+def _lead() -> None:
+    """Keep trying for the lease; resume the scheduler while holding it, pause otherwise."""
+    global _leader
+    while not _stop.is_set():
+        try:
+            holding = lease.acquire()
+        except SQLAlchemyError as e:
+            print(f"Scheduler lease check failed: {e}")
+            holding = False
+
+        if holding and not _leader:
+            scheduler.resume()
+            print(f"Scheduler leader: {lease.holder}")
+        elif not holding and _leader:
+            scheduler.pause()
+            print(f"Scheduler lease lost: {lease.holder}")
+        elif holding:
+            # Pick up jobs added or changed by other workers since the last check
+            scheduler.wakeup()
+        _leader = holding
+        _stop.wait(LEASE_SECONDS / 3)
+
+def start_scheduler() -> None:
+    """Start the scheduler with the persisted jobs; only the lease holder runs them."""
+    global _lease_thread
+    scheduler.start(paused=True)
+    try:
+        schedule_email_job()
+    except ValueError as e:
+        print(f"Email jobs not updated: {e}")
+    _stop.clear()
+    _lease_thread = threading.Thread(target=_lead, name="scheduler-lease", daemon=True)
+    _lease_thread.start()
+
+def stop_scheduler() -> None:
+    """Stop running jobs and hand the lease to another worker straight away."""
+    global _leader
+    _stop.set()
+    if _lease_thread is not None:
+        _lease_thread.join(timeout=5)
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    if _leader:
+        lease.release()
+        _leader = False
+
+class LeadTimeTrigger(BaseTrigger):
+    """Fires `lead` earlier than every fire time of `trigger` (used to pre-generate reports)."""
 
+    def __init__(self, trigger: BaseTrigger, lead: timedelta):
+        self.trigger = trigger
+        self.lead = lead
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        previous = previous_fire_time + self.lead if previous_fire_time else None
+        fire_time = self.trigger.get_next_fire_time(previous, now + self.lead)
+        return fire_time - self.lead if fire_time else None
+
+    def __str__(self):
+        return f"lead[{self.lead}, {self.trigger}]"
+
+def _profile_settings(profile: str):
+    if profile == DEFAULT_PROFILE:
+        return data_store.get_settings()
+    profiles = data_store.get_profiles()
+    if profile not in profiles:
+        raise KeyError(f"Unknown profile: {profile}")
+    return profiles[profile]
+
+def send_scheduled_report(profile: str = DEFAULT_PROFILE) -> None:
+    """Job target (module level so the persistent store can reference it)."""
+    print(f"Job fired at {datetime.now()} (local Cairo time) for {profile}")
+    # Delivered (with retries) by the outbox worker
+    email_outbox.enqueue(_profile_settings(profile))
+
+def pregenerate_report(profile: str = DEFAULT_PROFILE) -> None:
+    """Build (and cache) everything the next send of `profile` attaches."""
+    from project_pipeline.email_service import report_parts
+    # Pinned, so builds for other profiles due at the same time can't evict it before the send
+    with artifact_cache.pinned(PREGENERATE_MINUTES * 60 + PREGENERATE_PIN_SLACK):
+        report_parts(_profile_settings(profile))
+
+def build_trigger(settings) -> BaseTrigger:
+    """Cron trigger(s) for every configured day and time."""
+    if settings.cron:
+        return CronTrigger.from_crontab(settings.cron, timezone=TIMEZONE)
+
+    freq, days = settings.frequency, settings.days
+    if freq == "daily":
+        day_fields = {}
     elif freq == "weekly":
         if not days:
             raise ValueError("Weekly schedule requires 'days'")
-        day = str(days[0]).capitalize()[:3]  # e.g. "Mon", "Tue"
-        trigger = CronTrigger(day_of_week=day.lower(), hour=hour, minute=minute)    
-
+        # e.g. "Mon", "tuesday" -> "mon,tue"
+        day_fields = {"day_of_week": ",".join(str(d).lower()[:3] for d in days)}
     elif freq == "monthly":
         if not days:
             raise ValueError("Monthly schedule requires 'days'")
-        day = int(days[0])  # must be numeric (e.g. 1–31)
-        trigger = CronTrigger(day=day, hour=hour, minute=minute)    
-
+        day_fields = {"day": ",".join(str(int(d)) for d in days)}   # numeric (e.g. 1–31)
     else:
         raise ValueError(f"Unsupported frequency: {freq}")
 
-    
-    def job_wrapper():
-        print(f"Job fired at {datetime.now()} (local Cairo time)")
-        send_email_report()
-
-    # Add scheduled job
-    scheduler.add_job(
-        func=job_wrapper,
-        trigger=trigger,
-        id="scheduled_email",
-        replace_existing=True,
-    )
+    # One cron per time (a single cron would combine every hour with every minute)
+    triggers = []
+    for t in dict.fromkeys(settings.send_times()):
+        hour, minute = map(int, t.split(":"))
+        triggers.append(CronTrigger(hour=hour, minute=minute, timezone=TIMEZONE, **day_fields))
+    return triggers[0] if len(triggers) == 1 else OrTrigger(triggers)
+
+def desired_jobs() -> dict:
+    """{job id: (func, trigger)} for settings.json and every profile with recipients."""
+    sources = {DEFAULT_PROFILE: data_store.get_settings(), **data_store.get_profiles()}
+    jobs = {}
+    for profile, settings in sources.items():
+        if not settings.mailing_list.strip():
+            continue
+        try:
+            trigger = build_trigger(settings)
+        except ValueError as e:
+            # One bad schedule must not stop the others from being updated
+            print(f"Email job for {profile} not scheduled: {e}")
+            continue
+        jobs[f"email:{profile}"] = (send_scheduled_report, trigger, profile)
+        if PREGENERATE_MINUTES > 0:
+            jobs[f"pregen:{profile}"] = (pregenerate_report, LeadTimeTrigger(trigger, timedelta(minutes=PREGENERATE_MINUTES)), profile)
+    return jobs
+
+def schedule_email_job():
+    """Bring the scheduled jobs in line with settings.json and the profiles.
+
+    Only jobs whose trigger changed are replaced, and jobs for removed
+    profiles are deleted; everything else keeps its next run time.
+    """
+    wanted = desired_jobs()
+    existing = {
+        job.id: job for job in scheduler.get_jobs()
+        if job.id.startswith(("email:", "pregen:")) or job.id == "scheduled_email"
+    }
+
+    for job_id in existing.keys() - wanted.keys():
+        scheduler.remove_job(job_id)
+
+    changed = 0
+    for job_id, (func, trigger, profile) in wanted.items():
+        job = existing.get(job_id)
+        if job is not None and str(job.trigger) == str(trigger) and job.kwargs == {"profile": profile}:
+            continue
+        scheduler.add_job(func=func, trigger=trigger, kwargs={"profile": profile}, id=job_id, replace_existing=True)
+        changed += 1
 
-    print(f"Scheduled email job: {freq} at {time_str}, days={days} (Cairo time)")
+    print(f"Scheduled email jobs: {len(wanted)} ({changed} updated, {len(existing.keys() - wanted.keys())} removed)")
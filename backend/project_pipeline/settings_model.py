@@ -0,0 +1,174 @@
+from datetime import date
+from typing import List, Literal, Union, Optional
+from pydantic import BaseModel, Field, ValidationInfo, model_validator
+
+from project_pipeline.equations import validate_equation
+
+# All available KPIs
+ALL_KPIS = [f"kpi{i:03d}" for i in range(1, 10)]
+
+# Day names accepted for weekly schedules (first three letters, any case)
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# Validation context for settings read back from disk (see load_settings)
+LENIENT = {"lenient": True}
+
+def _lenient(info: ValidationInfo) -> bool:
+    return bool(info.context and info.context.get("lenient"))
+
+# One named chart series: a raw KPI (e.g. "kpi001") or an expression over KPIs
+class SeriesSetting(BaseModel):
+    name: str = Field(min_length=1)
+    expr: str
+
+    @model_validator(mode="after")
+    def check_expr(self, info: ValidationInfo):
+        """Reject unparseable expressions and unknown KPIs (the chart drops them when lenient)."""
+        if not _lenient(info):
+            validate_equation(self.expr, ALL_KPIS)
+        return self
+
+# Chart config (list of KPIs, a single equation, or a list of named series)
+class ChartSetting(BaseModel):
+    type: Literal["list", "equation", "series"]
+    value: Union[List[str], str, List[SeriesSetting]]
+
+    @model_validator(mode="after")
+    def check_value(self, info: ValidationInfo):
+        """Reject unparseable equations and unknown KPIs when settings are saved.
+
+        Stored settings are loaded leniently instead: the bad parts of the
+        chart are dropped with a warning, so they can still be read and fixed.
+        """
+        try:
+            self._check()
+        except ValueError as e:
+            if not _lenient(info):
+                raise
+            print(f"Ignoring invalid {self.type} chart setting: {e}")
+            self._drop_invalid()
+        return self
+
+    def _check(self) -> None:
+        if self.type == "equation" and self.value:
+            if not isinstance(self.value, str):
+                raise ValueError("Equation chart value must be a string")
+            validate_equation(self.value, ALL_KPIS)
+        if self.type == "list" and self.value:
+            if not isinstance(self.value, list) or not all(isinstance(v, str) for v in self.value):
+                raise ValueError("List chart value must be a list of KPI names")
+            unknown = [v for v in self.value if v not in ALL_KPIS]
+            if unknown:
+                raise ValueError(f"Unknown KPI(s) in list chart: {', '.join(unknown)}")
+        if self.type == "series":
+            if not isinstance(self.value, list) or not all(isinstance(v, SeriesSetting) for v in self.value):
+                raise ValueError("Series chart value must be a list of {name, expr}")
+            names = [v.name for v in self.value]
+            if len(names) != len(set(names)):
+                raise ValueError("Series names must be unique within a chart")
+            for v in self.value:
+                validate_equation(v.expr, ALL_KPIS)
+
+    def _drop_invalid(self) -> None:
+        """Keep only the valid KPIs / series (an invalid equation leaves the chart empty)."""
+        if self.type == "equation":
+            self.value = ""
+        elif self.type == "list":
+            self.value = [v for v in self.value if v in ALL_KPIS] if isinstance(self.value, list) else []
+        else:
+            kept = {}
+            for v in self.value if isinstance(self.value, list) else []:
+                try:
+                    validate_equation(v.expr, ALL_KPIS)
+                except (AttributeError, ValueError):
+                    continue
+                kept.setdefault(v.name, v)
+            self.value = list(kept.values())
+
+    def series(self, equation_name: str) -> list:
+        """(column name, expression) pairs plotted by this chart."""
+        if not self.value:
+            return []
+        if self.type == "equation":
+            return [(equation_name, self.value)]
+        if self.type == "series":
+            return [(v.name, v.expr) for v in self.value]
+        return [(kpi, kpi) for kpi in self.value]
+
+# App settings stored in settings.json
+class Settings(BaseModel):
+    days_back: int = 7      # calendar days up to the newest date (0 = all history)
+    start_date: Optional[date] = None   # explicit report window; overrides days_back
+    end_date: Optional[date] = None
+    frequency: Literal["daily", "weekly", "monthly"] = "daily"
+    time: Optional[str] = ""
+    times: List[str] = []           # several send times ("HH:MM"); `time` is used when empty
+    days: List[Union[str, int]] = []
+    cron: Optional[str] = None      # crontab expression, e.g. "0 8 * * mon-fri"; overrides frequency/days/times
+    mailing_list: str = ""
+    email_payload: Literal["pptx", "png", "inline", "pdf"] = "pptx"   # what report emails carry
+    line_chart: ChartSetting = ChartSetting(type="list", value=ALL_KPIS)
+    bar_chart: ChartSetting = ChartSetting(type="list", value=ALL_KPIS)
+    sites: List[str] = []   # restrict the report to these site codes (empty = all sites)
+    granularity: Literal["daily", "weekly", "monthly"] = "daily"
+    rollup_agg: Literal["mean", "sum"] = "mean"   # how daily values combine into a week/month
+    rolling_window: int = Field(default=0, ge=0)  # periods; adds <series>_rolling_mean to line series
+    percentile_bands: List[float] = []             # e.g. [10, 90] adds rolling <series>_p10/_p90
+
+    @model_validator(mode="after")
+    def check_bands(self):
+        """Percentile bands need a rolling window and must lie in 0-100."""
+        if self.percentile_bands:
+            if self.rolling_window < 2:
+                raise ValueError("percentile_bands require rolling_window >= 2")
+            if any(not 0 <= p <= 100 for p in self.percentile_bands):
+                raise ValueError("percentile_bands must be between 0 and 100")
+        return self
+
+    @model_validator(mode="after")
+    def check_schedule(self, info: ValidationInfo):
+        """Send times must be HH:MM, a cron expression must parse and weekly/monthly schedules need days.
+
+        Stored settings only get a warning; the scheduler skips them.
+        """
+        try:
+            self._check_schedule()
+        except ValueError as e:
+            if not _lenient(info):
+                raise
+            print(f"Invalid email schedule: {e}")
+        return self
+
+    def _check_schedule(self) -> None:
+        for t in self.send_times():
+            hour, _, minute = t.partition(":")
+            if not (hour.isdigit() and minute.isdigit() and int(hour) < 24 and int(minute) < 60):
+                raise ValueError(f"Invalid time {t!r} (expected HH:MM)")
+        if self.cron:
+            from apscheduler.triggers.cron import CronTrigger
+            CronTrigger.from_crontab(self.cron)
+            return
+        if self.frequency in ("weekly", "monthly") and not self.days:
+            raise ValueError(f"{self.frequency.capitalize()} schedule requires 'days'")
+        if self.frequency == "weekly":
+            bad = [d for d in self.days if str(d).lower()[:3] not in WEEKDAYS]
+            if bad:
+                raise ValueError(f"Invalid weekday(s) {bad} (expected e.g. 'Mon' or 'tuesday')")
+        if self.frequency == "monthly":
+            bad = [d for d in self.days if not str(d).strip().isdigit() or not 1 <= int(d) <= 31]
+            if bad:
+                raise ValueError(f"Invalid day(s) of the month {bad} (expected 1-31)")
+
+    def send_times(self) -> list:
+        """All configured send times (defaults to 12:00)."""
+        return self.times or [self.time or "12:00"]
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValueError("start_date must be on or before end_date")
+        return self
+
+def load_settings(data: dict) -> Settings:
+    """Settings as stored in settings.json/profiles.json, with invalid charts dropped instead of rejected."""
+    return Settings.model_validate(data, context=LENIENT)
@@ -0,0 +1,93 @@
+import pandas as pd
+import json
+from pathlib import Path
+
+# Define file paths (written by data_cleaner next to cleaned_dataset.csv)
+BASE_DIR = Path(__file__).resolve().parent.parent
+SITE_STORE_DIR = BASE_DIR / "cleaned_dataset.sites"
+
+# Lists the committed parts of a store; data_cleaner replaces it atomically.
+# The leading "_" keeps pyarrow from reading it as data.
+MANIFEST_NAME = "_manifest.json"
+
+# Group reductions supported by query_sites
+AGGREGATIONS = ("sum", "mean", "min", "max")
+
+def store_parts(store_dir: Path) -> list | None:
+    """Committed part files of a store (None for a store written before manifests)."""
+    try:
+        names = json.loads((store_dir / MANIFEST_NAME).read_text(encoding="utf-8"))["parts"]
+    except FileNotFoundError:
+        return None
+    return [store_dir / name for name in names]
+
+def _dataset():
+    import pyarrow.dataset as ds
+    if not SITE_STORE_DIR.exists():
+        raise FileNotFoundError(f"Per-site store not found at {SITE_STORE_DIR}")
+    parts = store_parts(SITE_STORE_DIR)
+    if parts is None:
+        return ds.dataset(SITE_STORE_DIR, format="parquet")
+    # Only committed parts: a crashed or running cleaner may have left others
+    return ds.dataset([str(p) for p in parts], format="parquet")
+
+def kpi_columns() -> list:
+    """KPI columns available in the per-site store."""
+    return [name for name in _dataset().schema.names if name not in ("date", "sitecode")]
+
+def load_sites(sites: list | None = None, start=None, end=None, columns: list | None = None) -> pd.DataFrame:
+    """Per-(date, site) rows for the given sites and inclusive date range.
+
+    Filters are pushed down to Parquet, so only matching row groups are read.
+    """
+    import pyarrow.dataset as ds
+    dataset = _dataset()
+    columns = kpi_columns() if columns is None else [c for c in columns if c in dataset.schema.names]
+
+    filt = None
+    for cond in (
+        ds.field("date") >= pd.Timestamp(start) if start is not None else None,
+        ds.field("date") <= pd.Timestamp(end) if end is not None else None,
+        ds.field("sitecode").isin(list(sites)) if sites else None,
+    ):
+        if cond is not None:
+            filt = cond if filt is None else filt & cond
+
+    df = dataset.to_table(columns=["date", "sitecode"] + columns, filter=filt).to_pandas()
+    df["sitecode"] = df["sitecode"].astype("category")
+    return df
+
+def list_sites() -> list:
+    """All site codes in the store."""
+    table = _dataset().to_table(columns=["sitecode"])
+    return sorted(table.column("sitecode").unique().to_pylist())
+
+def query_sites(
+    sites: list | None = None,
+    start=None,
+    end=None,
+    columns: list | None = None,
+    agg: str = "sum",
+) -> pd.DataFrame:
+    """Aggregate KPIs per date over a subset of sites (all sites if None).
+
+    With agg="sum" and every site selected this matches cleaned_dataset.csv.
+    """
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation: {agg}")
+    df = load_sites(sites, start, end, columns)
+    kpi_cols = [c for c in df.columns if c not in ("date", "sitecode")]
+
+    # Reduce in float64 (storage is float32) so sums over many sites stay accurate
+    grouped = df[kpi_cols].astype("float64").groupby(df["date"])
+    result = grouped.sum(min_count=1) if agg == "sum" else grouped.agg(agg)
+    result = result.dropna(how="all", subset=kpi_cols)
+    return result.reset_index()
+
+def site_stats(sites: list | None = None, start=None, end=None, columns: list | None = None) -> pd.DataFrame:
+    """Per-site min/max of each KPI (the table eda.py writes to site_kpi_min_max.xlsx)."""
+    df = load_sites(sites, start, end, columns)
+    kpi_cols = [c for c in df.columns if c not in ("date", "sitecode")]
+    stats = df.groupby("sitecode", observed=True)[kpi_cols].agg(["min", "max"])
+    stats.columns = [f"{kpi}_{stat}" for kpi, stat in stats.columns]
+    return stats.reset_index()
@@ -0,0 +1,15 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Tests import backend modules (data_cleaner, project_pipeline, ...) like app.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Stores opened at import time (email outbox, scheduler jobs) go to a scratch directory, not backend/
+_scratch = tempfile.mkdtemp(prefix="kpi-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault("EMAIL_OUTBOX_PATH", os.path.join(_scratch, "outbox.db"))
+os.environ.setdefault("SCHEDULER_DB_URL", f"sqlite:///{os.path.join(_scratch, 'scheduler.db')}")
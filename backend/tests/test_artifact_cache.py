@@ -0,0 +1,88 @@
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from project_pipeline import artifact_cache
+from project_pipeline.report_pipeline import ReportData, ReportPipeline
+from project_pipeline.settings_model import Settings
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_cache, "CACHE_DIR", tmp_path / "artifacts")
+    monkeypatch.setattr(artifact_cache, "MAX_ENTRIES", 2)
+    fingerprint = {"mtime_ns": 1, "size": 1, "last_date": "2024-03-01"}
+    monkeypatch.setattr(artifact_cache, "dataset_fingerprint", lambda: dict(fingerprint))
+    return fingerprint
+
+def _store(tmp_path, key: str) -> Path:
+    time.sleep(0.02)   # recency is the directory mtime: keep builds apart on coarse clocks
+    source = tmp_path / f"{key}.txt"
+    source.write_text(key)
+    return artifact_cache.store(key, "report.txt", source)
+
+def test_key_ignores_delivery_settings(cache):
+    key = artifact_cache.build_key(Settings())
+    assert artifact_cache.build_key(Settings(mailing_list="a@example.com", time="08:00", email_payload="pdf")) == key
+    assert artifact_cache.build_key(Settings(days_back=30)) != key
+    assert artifact_cache.build_key(Settings(), variant="native") != key
+    cache["last_date"] = "2024-03-02"
+    assert artifact_cache.build_key(Settings()) != key
+
+def test_lookup_hits_stored_artifacts(tmp_path):
+    assert artifact_cache.lookup("a", "report.txt") is None
+    stored = _store(tmp_path, "a")
+    assert artifact_cache.lookup("a", "report.txt") == stored
+    assert stored.read_text() == "a"
+    assert artifact_cache.lookup("a", "chart.png") is None
+
+def test_least_recently_used_builds_are_evicted(tmp_path):
+    for key in ("a", "b"):
+        _store(tmp_path, key)
+    time.sleep(0.02)
+    artifact_cache.lookup("a", "report.txt")   # a is now more recent than b
+    _store(tmp_path, "c")
+
+    assert artifact_cache.lookup("b", "report.txt") is None
+    assert artifact_cache.lookup("a", "report.txt") is not None
+    assert artifact_cache.lookup("c", "report.txt") is not None
+
+def test_pinned_builds_are_not_evicted(tmp_path):
+    with artifact_cache.pinned(60):
+        _store(tmp_path, "pinned")
+    for key in ("a", "b", "c"):
+        _store(tmp_path, key)
+
+    assert artifact_cache.lookup("pinned", "report.txt") is not None
+    assert sorted(p.name for p in artifact_cache.CACHE_DIR.iterdir()) == ["b", "c", "pinned"]
+
+@dataclass
+class CountingSink:
+    """Writes a small text artifact and counts how often it really ran."""
+    path: Path
+    name: str = "txt"
+    requires: tuple = ()
+    cache_name: str = "report.txt"
+    runs: list = field(default_factory=list)
+
+    def run(self, data: ReportData, results: dict) -> Path:
+        self.runs.append(data.settings.days_back)
+        self.path.write_text(f"{data.settings.days_back} days")
+        return self.path
+
+def test_pipeline_reuses_cached_builds(tmp_path):
+    sink = CountingSink(tmp_path / "report.txt")
+    pipeline = ReportPipeline([sink])
+
+    def run(settings, **kwargs):
+        data = ReportData(settings, pd.Series(dtype="datetime64[ns]"), pd.DataFrame(), pd.DataFrame())
+        return pipeline.run(data=data, **kwargs)["txt"]
+
+    run(Settings(days_back=7))
+    sink.path.unlink()
+    assert run(Settings(days_back=7, mailing_list="a@example.com")).read_text() == "7 days"   # copied from the cache
+    cached = run(Settings(days_back=30), publish=False)
+    assert cached.parent.parent == artifact_cache.CACHE_DIR and cached.read_text() == "30 days"
+    assert sink.runs == [7, 30]
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+from project_pipeline import email_outbox as outbox_module
+from project_pipeline.email_outbox import EmailOutbox
+from project_pipeline.email_service import EmailDeliveryError
+from project_pipeline.settings_model import Settings
+
+@pytest.fixture
+def outbox(tmp_path):
+    return EmailOutbox(tmp_path / "outbox.db")
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Deliveries made by the outbox: (ppt_path, recipients) instead of real emails."""
+    calls = []
+    monkeypatch.setattr(outbox_module, "send_email_report", lambda ppt_path, settings: calls.append((ppt_path, settings.mailing_list)))
+    return calls
+
+def _enqueue(outbox, recipients="a@example.com;b@example.com", **kwargs):
+    return outbox.enqueue(Settings(mailing_list=recipients), **kwargs)
+
+def test_claim_takes_each_job_once(outbox):
+    job = _enqueue(outbox)
+    row, wait = outbox._claim()
+    assert row["id"] == job["id"] and wait is None
+    assert outbox.job(job["id"])["status"] == "sending"
+
+    # Claimed and not yet due again: the next claim only reports how long to wait
+    row, wait = outbox._claim()
+    assert row is None and wait > outbox_module.OUTBOX_SEND_TIMEOUT - 5
+
+def test_finish_records_a_send(outbox, sent):
+    job = _enqueue(outbox)
+    row, _ = outbox._claim()
+    outbox._deliver(row)
+    outbox._finish(row, None)
+
+    assert sent == [(None, "a@example.com;b@example.com")]
+    assert outbox.job(job["id"])["status"] == "sent"
+    assert outbox._claim() == (None, None)
+
+def test_failed_recipients_are_retried_with_backoff(outbox):
+    job = _enqueue(outbox)
+    row, _ = outbox._claim()
+    outbox._finish(row, EmailDeliveryError({"b@example.com": "550"}))
+
+    retry = outbox.job(job["id"])
+    assert retry["status"] == "retrying"
+    assert retry["recipients"] == "b@example.com"
+    assert retry["attempts"] == 1
+    assert retry["next_attempt_at"] > time.time() + outbox_module.OUTBOX_BASE_DELAY * 0.7
+
+def test_last_attempt_and_invalid_jobs_are_dead(outbox, monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_BASE_DELAY", 0)
+    monkeypatch.setattr(outbox_module, "OUTBOX_MAX_ATTEMPTS", 2)
+    job = _enqueue(outbox)
+    for _ in range(2):
+        row, _ = outbox._claim()
+        outbox._finish(row, ConnectionError("refused"))
+    assert outbox.job(job["id"])["status"] == "dead"
+
+    job = _enqueue(outbox)
+    row, _ = outbox._claim()
+    outbox._finish(row, ValueError("No recipients"))
+    assert outbox.job(job["id"])["status"] == "dead"
+
+def test_missing_artifact_is_retried(outbox, sent, tmp_path):
+    job = _enqueue(outbox, ppt_path=tmp_path / "gone.pptx")
+    row, _ = outbox._claim()
+    outbox._finish(row, FileNotFoundError("evicted"))
+    assert outbox.job(job["id"])["status"] == "retrying"
+
+    # The prebuilt deck is gone: the send builds a new one
+    outbox._deliver(row)
+    assert sent == [(None, "a@example.com;b@example.com")]
+
+def test_stale_claim_is_taken_over(outbox, monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_SEND_TIMEOUT", -1)   # every claim is already expired
+    job = _enqueue(outbox)
+    stale, _ = outbox._claim()
+    fresh, _ = outbox._claim()
+    assert fresh["id"] == stale["id"] == job["id"]
+
+    # The first worker finishes late: its result is dropped, the new claim's is kept
+    outbox._finish(fresh, None)
+    outbox._finish(stale, ConnectionError("timed out"))
+    assert outbox.job(job["id"])["status"] == "sent"
+    assert outbox.job(job["id"])["attempts"] == 1
+
+def test_worker_drains_the_queue(outbox, sent):
+    async def drain():
+        await outbox.start()
+        try:
+            _enqueue(outbox, recipients="a@example.com")
+            _enqueue(outbox, recipients="b@example.com")
+            for _ in range(500):
+                if outbox.status()["counts"] == {"sent": 2}:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await outbox.stop()
+
+    asyncio.run(drain())
+    assert sorted(r for _, r in sent) == ["a@example.com", "b@example.com"]
+    assert outbox.status()["counts"] == {"sent": 2}
@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+
+import data_cleaner
+from data_cleaner import clean_and_aggregate
+from project_pipeline.equations import EquationError, compile_batch, validate_equation
+from project_pipeline.excel_export import safe_eval_equation
+from project_pipeline.site_store import store_parts
+from project_pipeline.settings_model import ALL_KPIS, ChartSetting, Settings, load_settings
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"kpi001": [1.0, 4.0, np.nan], "kpi002": [2.0, 0.0, 3.0], "kpi003": [3.0, 2.0, 1.0]})
+
+# --- Equations ---
+
+@pytest.mark.parametrize("equation, expected", [
+    ("kpi001 + kpi002 * kpi003", [7.0, 4.0]),
+    ("(kpi001 + kpi002) * kpi003", [9.0, 8.0]),
+    ("kpi001 - kpi002 - kpi003", [-4.0, 2.0]),
+    ("kpi003 / kpi001 / 2", [1.5, 0.25]),
+    ("kpi001 + kpi002 / 2 * kpi003", [4.0, 4.0]),
+])
+def test_operator_precedence(frame, equation, expected):
+    assert safe_eval_equation(frame, equation).tolist()[:2] == expected
+
+@pytest.mark.parametrize("equation, expected", [
+    ("-kpi001", [-1.0, -4.0]),
+    ("-kpi001 + kpi003", [2.0, -2.0]),
+    ("kpi003 * -kpi001", [-3.0, -8.0]),
+    ("--kpi001", [1.0, 4.0]),
+    ("-(kpi001 - kpi003)", [2.0, -2.0]),
+])
+def test_unary_minus(frame, equation, expected):
+    assert safe_eval_equation(frame, equation).tolist()[:2] == expected
+
+def test_division_by_zero_and_missing_values_give_nan(frame):
+    result = safe_eval_equation(frame, "kpi001 / kpi002")
+    assert result[0] == 0.5
+    assert np.isnan(result[1])   # 4 / 0
+    assert np.isnan(result[2])   # NaN / 3
+    assert np.isnan(safe_eval_equation(frame, "1 / 0")).all()
+
+def test_constant_equation_is_broadcast(frame):
+    assert safe_eval_equation(frame, "2 * (3 + 1)").tolist() == [8.0, 8.0, 8.0]
+
+def test_batch_matches_single_equations(frame):
+    equations = ("kpi001 + kpi002", "(kpi001 + kpi002) / kpi003", "-kpi003")
+    batch = compile_batch(equations).evaluate({c: frame[c].to_numpy() for c in frame})
+    for eq in equations:
+        np.testing.assert_array_equal(batch[eq], safe_eval_equation(frame, eq).to_numpy())
+
+def test_unknown_names_are_rejected(frame):
+    with pytest.raises(EquationError, match="kpi999"):
+        validate_equation("kpi001 + kpi999", ALL_KPIS)
+    with pytest.raises(ValueError, match="kpi004"):
+        safe_eval_equation(frame, "kpi004 * 2")
+
+@pytest.mark.parametrize("equation", ["kpi001 +", "(kpi001", "kpi001 kpi002", "kpi001 ** 2", "__import__('os')", ""])
+def test_invalid_equations_are_rejected(equation):
+    with pytest.raises(EquationError):
+        validate_equation(equation, ALL_KPIS)
+
+# --- Chart settings ---
+
+@pytest.mark.parametrize("value", [["kpi999"], "kpi001", ["kpi001", "kpi010"]])
+def test_list_chart_rejects_bad_values(value):
+    with pytest.raises(ValidationError):
+        ChartSetting(type="list", value=value)
+
+def test_chart_settings_accept_valid_values():
+    assert ChartSetting(type="list", value=["kpi001", "kpi002"]).series("x") == [("kpi001", "kpi001"), ("kpi002", "kpi002")]
+    assert ChartSetting(type="equation", value="kpi001 / 2").series("x") == [("x", "kpi001 / 2")]
+    with pytest.raises(ValidationError):
+        ChartSetting(type="equation", value="kpi001 / kpi999")
+
+STORED_CHARTS = {
+    "line_chart": {"type": "equation", "value": "kpi999"},
+    "bar_chart": {"type": "series", "value": [{"name": "a", "expr": "kpi001"}, {"name": "b", "expr": "kpi001 +"}]},
+}
+
+def test_stored_settings_drop_invalid_charts():
+    with pytest.raises(ValidationError):
+        Settings(**STORED_CHARTS)
+    s = load_settings(STORED_CHARTS)
+    assert s.line_chart.value == ""
+    assert s.bar_chart.series("x") == [("a", "kpi001")]
+    assert load_settings({"line_chart": {"type": "list", "value": ["kpi002", "kpi999"]}}).line_chart.value == ["kpi002"]
+
+@pytest.mark.parametrize("schedule", [
+    {"frequency": "weekly", "days": []},
+    {"frequency": "weekly", "days": ["Funday"]},
+    {"frequency": "monthly", "days": []},
+    {"frequency": "monthly", "days": ["first", 32]},
+])
+def test_schedule_days_are_checked_against_frequency(schedule):
+    with pytest.raises(ValidationError):
+        Settings(**schedule)
+    assert load_settings(schedule).frequency == schedule["frequency"]   # stored: warned, not rejected
+
+# --- Incremental cleaning ---
+
+RAW_HEADER = "Date,Site,kpi001,kpi002,kpi003\n"
+
+def _raw_rows(days, sites=("A", "B", "C")):
+    rows = []
+    for day in days:
+        for i, site in enumerate(sites):
+            # Some missing values, and a site with no kpi003 at all
+            kpi3 = "" if site == "C" else f"{day * 0.7 + i:.4f}"
+            kpi1 = "" if (day + i) % 5 == 0 else f"{day * 1.1 + i:.4f}"
+            rows.append(f"{day:02d}/03/2024,{site},{kpi1},{day * 13.37 + i:.4f},{kpi3}\n")
+    return "".join(rows)
+
+def _assert_same(incremental: pd.DataFrame, full_path):
+    full = pd.read_csv(full_path, parse_dates=["date"])
+    pd.testing.assert_frame_equal(incremental.reset_index(drop=True), full.reset_index(drop=True), check_dtype=False)
+
+def test_incremental_matches_full_rebuild(tmp_path):
+    raw = tmp_path / "raw.csv"
+    raw.write_text(RAW_HEADER + _raw_rows(range(1, 11)))
+
+    inc_out = tmp_path / "inc" / "cleaned.csv"
+    full_out = tmp_path / "full" / "cleaned.csv"
+    clean_and_aggregate(raw, inc_out, chunksize=4, incremental=True)
+
+    # Appended rows, including one more row for an already aggregated day
+    with open(raw, "a") as f:
+        f.write(_raw_rows(range(11, 16)) + "10/03/2024,D,1.5,2.5,3.5\n")
+    clean_and_aggregate(raw, inc_out, chunksize=4, incremental=True)
+    clean_and_aggregate(raw, full_out)
+    _assert_same(pd.read_csv(inc_out, parse_dates=["date"]), full_out)
+
+    # A last row without a trailing newline is included, then completed
+    with open(raw, "a") as f:
+        f.write("16/03/2024,A,1,2")
+    clean_and_aggregate(raw, inc_out, chunksize=4, incremental=True)
+    clean_and_aggregate(raw, full_out)
+    _assert_same(pd.read_csv(inc_out, parse_dates=["date"]), full_out)
+
+    with open(raw, "a") as f:
+        f.write("0,3\n")
+    clean_and_aggregate(raw, inc_out, chunksize=4, incremental=True)
+    clean_and_aggregate(raw, full_out)
+    _assert_same(pd.read_csv(inc_out, parse_dates=["date"]), full_out)
+
+def test_rewritten_raw_file_triggers_full_rebuild(tmp_path):
+    raw = tmp_path / "raw.csv"
+    raw.write_text(RAW_HEADER + _raw_rows(range(1, 8)))
+    inc_out = tmp_path / "inc" / "cleaned.csv"
+    full_out = tmp_path / "full" / "cleaned.csv"
+    clean_and_aggregate(raw, inc_out, incremental=True)
+
+    raw.write_text(RAW_HEADER + _raw_rows(range(3, 9), sites=("A", "B")))
+    clean_and_aggregate(raw, inc_out, incremental=True)
+    clean_and_aggregate(raw, full_out)
+    _assert_same(pd.read_csv(inc_out, parse_dates=["date"]), full_out)
+
+def test_full_rebuild_resets_incremental_state(tmp_path):
+    raw = tmp_path / "raw.csv"
+    raw.write_text(RAW_HEADER + _raw_rows(range(1, 6)))
+    out = tmp_path / "cleaned.csv"
+    clean_and_aggregate(raw, out, incremental=True)
+    with open(raw, "a") as f:
+        f.write(_raw_rows(range(6, 11)))
+    clean_and_aggregate(raw, out)
+    clean_and_aggregate(raw, out, incremental=True)
+
+    sites = pd.read_parquet(tmp_path / "cleaned.sites")
+    assert len(sites) == 10 * 3
+    assert not sites.duplicated(["date", "sitecode"]).any()
+
+def _store_rows(store_dir):
+    return pd.concat([pd.read_parquet(p) for p in store_parts(store_dir)], ignore_index=True)
+
+def test_site_store_compaction_switches_parts_atomically(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cleaner, "SITE_STORE_MAX_PARTS", 2)
+    raw = tmp_path / "raw.csv"
+    raw.write_text(RAW_HEADER + _raw_rows(range(1, 3)))
+    out = tmp_path / "cleaned.csv"
+    store = tmp_path / "cleaned.sites"
+    for day in range(3, 6):
+        clean_and_aggregate(raw, out, chunksize=3, incremental=True)
+        with open(raw, "a") as f:
+            f.write(_raw_rows([day]))
+    clean_and_aggregate(raw, out, chunksize=3, incremental=True)
+    assert len(_store_rows(store)) == 5 * 3
+    assert sorted(store.glob("part-*.parquet")) == store_parts(store)
+
+    # A crash between writing the merged part and the manifest switch
+    writer = data_cleaner._SiteStoreWriter(store, reset=False)
+    writer.write(pd.DataFrame({"date": pd.to_datetime(["2024-03-06"]), "sitecode": ["A"], "kpi001": [1.0]}), ["kpi001"])
+    monkeypatch.setattr(data_cleaner, "SITE_STORE_MAX_PARTS", 0)
+    writer.compact()
+    assert len(_store_rows(store)) == 5 * 3
+    assert len(list(store.glob("part-*.parquet"))) > len(store_parts(store))
+
+    # The next writer removes the parts that were never committed
+    data_cleaner._SiteStoreWriter(store, reset=False)
+    assert sorted(store.glob("part-*.parquet")) == store_parts(store)
@@ -0,0 +1,56 @@
+import threading
+
+from project_pipeline.report_jobs import ReportJobQueue
+
+class BlockingBuild:
+    """Stand-in for regenerate_reports that waits for `release` and records its settings."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, settings):
+        self.calls.append(settings)
+        self.started.set()
+        self.release.wait(5)
+        if settings == "broken":
+            raise RuntimeError("render failed")
+        return {"pptx": f"report-{settings}.pptx"}
+
+def test_saves_during_a_build_are_coalesced():
+    build = BlockingBuild()
+    queue = ReportJobQueue(run=build)
+    try:
+        first = queue.submit("s1")
+        assert build.started.wait(5)
+        queued = [queue.submit(s) for s in ("s2", "s3", "s4")]
+        build.release.set()
+        assert queue.wait_idle(timeout=5)
+    finally:
+        queue.stop()
+
+    # Only the running build and the latest save were rendered
+    assert build.calls == ["s1", "s4"]
+    assert queue.job(first["id"])["status"] == "done"
+    assert [queue.job(j["id"])["status"] for j in queued] == ["superseded", "superseded", "done"]
+    assert queue.job(queued[0]["id"])["superseded_by"] == queued[1]["id"]
+
+    artifact = queue.status()["artifacts"]["pptx"]
+    assert artifact["version"] == 2
+    assert artifact["path"] == "report-s4.pptx"
+    assert artifact["job_id"] == queued[-1]["id"]
+
+def test_failed_build_is_reported():
+    build = BlockingBuild()
+    build.release.set()
+    queue = ReportJobQueue(run=build)
+    try:
+        job = queue.submit("broken")
+        assert queue.wait_idle(timeout=5)
+    finally:
+        queue.stop()
+
+    assert queue.job(job["id"])["status"] == "failed"
+    assert "render failed" in queue.job(job["id"])["error"]
+    assert queue.status()["artifacts"] == {}
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from project_pipeline.scheduler_service import LeaderLease
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'scheduler.db'}")
+
+def test_one_holder_at_a_time(engine):
+    first, second = LeaderLease(engine, ttl=30), LeaderLease(engine, ttl=30)
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire()   # renewing keeps it
+    assert not second.acquire()
+
+def test_expired_lease_is_taken_over(engine):
+    first, second = LeaderLease(engine, ttl=0.1), LeaderLease(engine, ttl=0.1)
+    assert first.acquire()
+    time.sleep(0.2)   # the holder stopped renewing
+    assert second.acquire()
+    assert not first.acquire()
+
+def test_release_hands_over_at_once(engine):
+    first, second = LeaderLease(engine, ttl=30), LeaderLease(engine, ttl=30)
+    assert first.acquire()
+    second.release()   # not the holder: no effect
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+
+def test_leases_are_independent_by_name(engine):
+    assert LeaderLease(engine, name="a").acquire()
+    assert LeaderLease(engine, name="b").acquire()
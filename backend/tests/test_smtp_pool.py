@@ -0,0 +1,102 @@
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+from project_pipeline.email_service import SMTPPool
+
+controller_module = pytest.importorskip("aiosmtpd.controller")
+
+class Recorder:
+    """aiosmtpd handler keeping (client address, recipients) of every message."""
+
+    def __init__(self):
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append((session.peer, envelope.rcpt_tos))
+        return "250 OK"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class LocalServer:
+    """aiosmtpd server on a fixed local port that can be restarted."""
+
+    def __init__(self):
+        self.recorder = Recorder()
+        self.port = _free_port()
+        self.controller = None
+
+    def start(self) -> None:
+        self.controller = controller_module.Controller(self.recorder, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+
+    def stop(self) -> None:
+        self.controller.stop()
+
+    def pool(self, **options) -> SMTPPool:
+        return SMTPPool(host="127.0.0.1", port=self.port, security="none", **options)
+
+    @property
+    def received(self) -> list:
+        return self.recorder.received
+
+@pytest.fixture
+def smtp_server():
+    server = LocalServer()
+    server.start()
+    yield server
+    server.stop()
+
+def _message(to: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "reports@example.com"
+    msg["To"] = to
+    msg["Subject"] = "KPIs"
+    msg.set_content("report")
+    return msg
+
+def test_connection_is_reused(smtp_server):
+    pool = smtp_server.pool(size=2)
+    for i in range(3):
+        pool.send(_message(f"user{i}@example.com"))
+
+    assert [rcpt for _, rcpt in smtp_server.received] == [[f"user{i}@example.com"] for i in range(3)]
+    assert len({peer for peer, _ in smtp_server.received}) == 1
+
+def test_send_many_stays_within_pool_size(smtp_server):
+    pool = smtp_server.pool(size=2)
+    failed = pool.send_many([_message(f"user{i}@example.com") for i in range(8)])
+
+    assert failed == {}
+    assert len(smtp_server.received) == 8
+    assert len({peer for peer, _ in smtp_server.received}) <= 2
+
+def test_reconnects_after_server_restart(smtp_server):
+    pool = smtp_server.pool(size=1, keepalive=3600)
+    pool.send(_message("first@example.com"))
+
+    # The restart drops the pooled connection; it is too recent to be checked with NOOP
+    smtp_server.stop()
+    smtp_server.start()
+    pool.send(_message("second@example.com"))
+
+    assert [rcpt for _, rcpt in smtp_server.received] == [["first@example.com"], ["second@example.com"]]
+    assert smtp_server.received[0][0] != smtp_server.received[1][0]
+
+def test_idle_connection_is_checked_with_noop(smtp_server):
+    pool = smtp_server.pool(size=1, keepalive=0)
+    pool.send(_message("first@example.com"))
+    pool.send(_message("second@example.com"))
+    # NOOP succeeded, so the second message went over the same connection
+    assert smtp_server.received[0][0] == smtp_server.received[1][0]
+
+    smtp_server.stop()
+    smtp_server.start()
+    pool.send(_message("third@example.com"))
+    # NOOP failed on the dropped connection, so a new one was opened
+    assert len(smtp_server.received) == 3
+    assert smtp_server.received[2][0] != smtp_server.received[1][0]
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+import auth_service
+from auth_service import UserCache, UserOut
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() as seen by auth_service."""
+    now = [1000.0]
+    monkeypatch.setattr(auth_service.time, "monotonic", lambda: now[0])
+    return now
+
+def _user(user_id: int) -> UserOut:
+    return UserOut(id=user_id, email=f"user{user_id}@example.com", created_at=datetime(2024, 1, 1))
+
+def test_entries_expire_after_ttl(clock):
+    cache = UserCache(ttl=30, size=10)
+    cache.put(_user(1))
+    clock[0] += 29
+    assert cache.get(1).email == "user1@example.com"
+    clock[0] += 2
+    assert cache.get(1) is None
+    assert cache.get(1) is None   # expired entries are dropped, not kept around
+
+def test_least_recently_used_user_is_dropped(clock):
+    cache = UserCache(ttl=30, size=2)
+    cache.put(_user(1))
+    cache.put(_user(2))
+    cache.get(1)
+    cache.put(_user(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+def test_zero_ttl_disables_caching(clock):
+    cache = UserCache(ttl=0, size=10)
+    cache.put(_user(1))
+    assert cache.get(1) is None
+
+def test_invalidate(clock):
+    cache = UserCache(ttl=30, size=10)
+    cache.put(_user(1))
+    cache.put(_user(2))
+    cache.invalidate(1)
+    assert cache.get(1) is None and cache.get(2) is not None
+    cache.invalidate()
+    assert cache.get(2) is None
@@ -0,0 +1,251 @@
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio, asyncpg, os, sqlite3, ssl, threading, time
+
+# Postgres pool tuning (see asyncpg.create_pool)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_MAX_QUERIES = int(os.getenv("DB_MAX_QUERIES", "50000"))                     # queries before a connection is replaced
+DB_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_LIFETIME", "300"))  # seconds idle before closing
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "10"))
+DB_SSL = os.getenv("DB_SSL", "true").lower() in ("1", "true", "yes")
+
+# Hot queries, prepared once per Postgres connection
+QUERIES = {
+    "by_id": "SELECT id, email, created_at FROM users WHERE id=$1",
+    "by_email": "SELECT id, email, created_at, password_hash FROM users WHERE email=$1",
+    "create": "INSERT INTO users (email, password_hash) VALUES ($1, $2) RETURNING id, email, created_at",
+    "set_hash": "UPDATE users SET password_hash=$1 WHERE id=$2",
+}
+
+class DuplicateEmailError(Exception):
+    """A user with this email already exists."""
+
+class UserRepository(ABC):
+    """Storage for auth users. Rows are dicts with id, email, created_at (+ password_hash by email)."""
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get_by_id(self, user_id: int) -> dict | None:
+        ...
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    async def create(self, email: str, password_hash: str) -> dict:
+        ...
+
+    @abstractmethod
+    async def set_password_hash(self, user_id: int, password_hash: str) -> None:
+        ...
+
+    def metrics(self) -> dict:
+        return {"backend": type(self).__name__}
+
+# --- Postgres ---
+
+class _UserConnection(asyncpg.Connection):
+    """Connection carrying the prepared user queries."""
+    __slots__ = ("user_statements",)
+
+class PostgresUserRepository(UserRepository):
+    """asyncpg pool with configurable sizing, per-connection prepared statements and acquire metrics."""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.pool = None
+        self._waiting = 0
+        self._acquires = 0
+        self._acquire_total = 0.0
+        self._acquire_max = 0.0
+
+    @staticmethod
+    async def _prepare(conn) -> None:
+        conn.user_statements = {name: await conn.prepare(sql) for name, sql in QUERIES.items()}
+
+    async def start(self) -> None:
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            ssl=ssl.create_default_context() if DB_SSL else None,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            max_queries=DB_MAX_QUERIES,
+            max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            command_timeout=DB_COMMAND_TIMEOUT,
+            connection_class=_UserConnection,
+            init=self._prepare,
+        )
+
+    async def close(self) -> None:
+        if self.pool:
+            await self.pool.close()
+
+    @asynccontextmanager
+    async def _acquire(self):
+        self._waiting += 1
+        started = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - started
+        self._acquires += 1
+        self._acquire_total += waited
+        self._acquire_max = max(self._acquire_max, waited)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+    async def _fetchrow(self, name: str, *args):
+        async with self._acquire() as conn:
+            row = await conn.user_statements[name].fetchrow(*args)
+        return dict(row) if row else None
+
+    async def get_by_id(self, user_id: int) -> dict | None:
+        return await self._fetchrow("by_id", user_id)
+
+    async def get_by_email(self, email: str) -> dict | None:
+        return await self._fetchrow("by_email", email)
+
+    async def create(self, email: str, password_hash: str) -> dict:
+        try:
+            return await self._fetchrow("create", email, password_hash)
+        except asyncpg.UniqueViolationError:
+            raise DuplicateEmailError(email)
+
+    async def set_password_hash(self, user_id: int, password_hash: str) -> None:
+        async with self._acquire() as conn:
+            await conn.user_statements["set_hash"].fetch(password_hash, user_id)
+
+    def metrics(self) -> dict:
+        size = self.pool.get_size() if self.pool else 0
+        idle = self.pool.get_idle_size() if self.pool else 0
+        return {
+            **super().metrics(),
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "waiters": self._waiting,
+            "acquires": self._acquires,
+            "acquire_ms_avg": round(1000 * self._acquire_total / self._acquires, 3) if self._acquires else 0.0,
+            "acquire_ms_max": round(1000 * self._acquire_max, 3),
+        }
+
+# --- Local stand-ins (load tests, benchmarks, development without Postgres) ---
+
+class SQLiteUserRepository(UserRepository):
+    """Users in a local SQLite file; queries run on a worker thread."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self._queries = 0
+
+    async def start(self) -> None:
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(self.SCHEMA)
+        self._db.commit()
+
+    async def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+
+    def _run(self, sql: str, args: tuple = ()):
+        with self._lock:
+            self._queries += 1
+            with self._db:
+                row = self._db.execute(sql, args).fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        if "created_at" in row:
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+        return row
+
+    async def _query(self, sql: str, *args):
+        return await asyncio.to_thread(self._run, sql, args)
+
+    async def get_by_id(self, user_id: int) -> dict | None:
+        return await self._query("SELECT id, email, created_at FROM users WHERE id=?", user_id)
+
+    async def get_by_email(self, email: str) -> dict | None:
+        return await self._query("SELECT id, email, created_at, password_hash FROM users WHERE email=?", email)
+
+    async def create(self, email: str, password_hash: str) -> dict:
+        try:
+            return await self._query(
+                "INSERT INTO users (email, password_hash, created_at) VALUES (?, ?, ?) RETURNING id, email, created_at",
+                email, password_hash, datetime.now().isoformat(),
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateEmailError(email)
+
+    async def set_password_hash(self, user_id: int, password_hash: str) -> None:
+        await self._query("UPDATE users SET password_hash=? WHERE id=?", password_hash, user_id)
+
+    def metrics(self) -> dict:
+        return {**super().metrics(), "path": self.path, "queries": self._queries}
+
+class MemoryUserRepository(UserRepository):
+    """Users in a dict (lost on restart)."""
+
+    def __init__(self):
+        self._users = {}      # id -> row
+        self._by_email = {}   # email -> id
+
+    async def get_by_id(self, user_id: int) -> dict | None:
+        row = self._users.get(user_id)
+        return {k: row[k] for k in ("id", "email", "created_at")} if row else None
+
+    async def get_by_email(self, email: str) -> dict | None:
+        user_id = self._by_email.get(email)
+        return dict(self._users[user_id]) if user_id is not None else None
+
+    async def create(self, email: str, password_hash: str) -> dict:
+        if email in self._by_email:
+            raise DuplicateEmailError(email)
+        user_id = len(self._users) + 1
+        self._users[user_id] = {"id": user_id, "email": email, "password_hash": password_hash, "created_at": datetime.now()}
+        self._by_email[email] = user_id
+        return await self.get_by_id(user_id)
+
+    async def set_password_hash(self, user_id: int, password_hash: str) -> None:
+        self._users[user_id]["password_hash"] = password_hash
+
+    def metrics(self) -> dict:
+        return {**super().metrics(), "users": len(self._users)}
+
+def create_repository(url: str | None) -> UserRepository:
+    """Repository for DATABASE_URL: "memory://", "sqlite:///path/users.db" or a Postgres DSN."""
+    if not url:
+        raise ValueError("DATABASE_URL is not set")
+    if url.startswith("memory://"):
+        return MemoryUserRepository()
+    if url.startswith("sqlite:///"):
+        return SQLiteUserRepository(url[len("sqlite:///"):])
+    return PostgresUserRepository(url)